@@ -8,4 +8,56 @@ class Settings:
     DB_PORT: str = os.getenv("DB_PORT", "5432")
     DB_NAME: str = os.getenv("DB_NAME", "gunshot")
 
-settings = Settings()
\ No newline at end of file
+    # Postgres (asyncpg) connection pool and statement caching
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))  # 0 behind pgbouncer
+    # Log batches at least this large are written with COPY instead of a multi-row INSERT
+    DB_COPY_MIN_ROWS: int = int(os.getenv("DB_COPY_MIN_ROWS", "100"))
+
+    # Localization runs off the event loop: "process" (default) or "thread"
+    LOCALIZATION_EXECUTOR: str = os.getenv("LOCALIZATION_EXECUTOR", "process")
+    LOCALIZATION_WORKERS: int = int(os.getenv("LOCALIZATION_WORKERS", os.cpu_count() or 1))
+    # Allow the emission time to precede the first arrival; "false" reproduces the old Powell fixes
+    LOCALIZATION_EARLY_EMISSION: bool = os.getenv("LOCALIZATION_EARLY_EMISSION", "true").lower() in ("1", "true", "yes")
+
+    # Group commit for /log_event: flush every N ms or M rows, whichever comes first
+    INGEST_FLUSH_INTERVAL_MS: float = float(os.getenv("INGEST_FLUSH_INTERVAL_MS", "10"))
+    INGEST_MAX_BATCH_ROWS: int = int(os.getenv("INGEST_MAX_BATCH_ROWS", "500"))
+    INGEST_MAX_QUEUE: int = int(os.getenv("INGEST_MAX_QUEUE", "10000"))
+    # Largest batch POST /log_events accepts; bigger ones get 413 and should be split by the sender
+    LOG_EVENTS_MAX_BATCH: int = int(os.getenv("LOG_EVENTS_MAX_BATCH", "5000"))
+
+    # Per-client WebSocket send queue and what to do when a client can't keep up
+    WS_QUEUE_SIZE: int = int(os.getenv("WS_QUEUE_SIZE", "100"))
+    WS_OVERFLOW_POLICY: str = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")  # or "disconnect"
+
+    # At most one sensor_delta broadcast per interval, carrying every change since the last one
+    SENSOR_BROADCAST_INTERVAL_MS: float = float(os.getenv("SENSOR_BROADCAST_INTERVAL_MS", "250"))
+
+    # SQLite profile: "tuned" (WAL, pragmas, one writer connection + read pool) or "default"
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "./gunshot.db")
+    SQLITE_PROFILE: str = os.getenv("SQLITE_PROFILE", "tuned")
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+    # /export/* downloads running at once; each holds a connection (its own pool on tuned SQLite) throughout
+    EXPORT_MAX_CONCURRENT: int = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+    # log_events partitioning (Postgres only: one range partition per day) and retention
+    LOG_PARTITIONING: bool = os.getenv("LOG_PARTITIONING", "true").lower() in ("1", "true", "yes")
+    LOG_PARTITION_PREMAKE_DAYS: int = int(os.getenv("LOG_PARTITION_PREMAKE_DAYS", "2"))
+    LOG_RETENTION_DAYS: float = float(os.getenv("LOG_RETENTION_DAYS", "0"))  # 0 keeps logs forever
+    LOG_RETENTION_INTERVAL_S: float = float(os.getenv("LOG_RETENTION_INTERVAL_S", "3600"))
+    LOG_RETENTION_BATCH_ROWS: int = int(os.getenv("LOG_RETENTION_BATCH_ROWS", "5000"))
+
+    # Cold storage: days older than ARCHIVE_AFTER_DAYS move to per-day Parquet/.npz files (0 disables)
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "./archive")
+    ARCHIVE_AFTER_DAYS: float = float(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+
+settings = Settings()
@@ -1,7 +1,8 @@
 # app/models/__init__.py
 from .base import Base
 from .gunshot_event import GunshotEvent
+from .gunshot_event_log import GunshotEventLog
 from .log_event import LogEvent
 from .microphone import Microphone
 
-__all__ = ["Base", "GunshotEvent", "LogEvent", "Microphone"]
\ No newline at end of file
+__all__ = ["Base", "GunshotEvent", "GunshotEventLog", "LogEvent", "Microphone"]
\ No newline at end of file
@@ -4,7 +4,9 @@ from app.models.base import Base
 class GunshotEvent(Base):
     __tablename__ = "gunshot_events"
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(BigInteger, nullable=False)
+    timestamp = Column(BigInteger, nullable=False, index=True)
     lat = Column(Float, nullable=True)
     lon = Column(Float, nullable=True)
-    logs = Column(JSON, nullable=False)
\ No newline at end of file
+    logs = Column(JSON, nullable=True)  # Legacy copy of the logs; new events use gunshot_event_logs
+    # Ids are never reused after deletes, so archived and live events cannot collide
+    __table_args__ = {"sqlite_autoincrement": True}
\ No newline at end of file
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from app.models.base import Base
+from app.models.log_event import LOG_EVENTS_PARTITIONED
+
+# A partitioned log_events has no unique constraint on id alone, so there is nothing for a
+# foreign key to reference; the retention job removes links before it drops a partition.
+log_event_reference = [] if LOG_EVENTS_PARTITIONED else [ForeignKey("log_events.id", ondelete="CASCADE")]
+
+class GunshotEventLog(Base):
+    """ Which logs a gunshot event was located from; a log belongs to at most one event """
+    __tablename__ = "gunshot_event_logs"
+    gunshot_event_id = Column(Integer, ForeignKey("gunshot_events.id", ondelete="CASCADE"), primary_key=True)
+    log_event_id = Column(Integer, *log_event_reference, primary_key=True, unique=True, index=True)
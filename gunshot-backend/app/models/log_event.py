@@ -1,10 +1,24 @@
-from sqlalchemy import Column, Integer, Float, BigInteger
+from sqlalchemy import Column, Integer, Float, BigInteger, Index
+from app.core.config import settings
 from app.models.base import Base
 
+# On Postgres log_events is range-partitioned by timestamp, one partition per day
+LOG_EVENTS_PARTITIONED = settings.DB_TYPE == "postgres" and settings.LOG_PARTITIONING
+
 class LogEvent(Base):
     __tablename__ = "log_events"
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(BigInteger, index=True)
+    if LOG_EVENTS_PARTITIONED:
+        # The partition key has to be part of every unique constraint, the primary key included
+        id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+        timestamp = Column(BigInteger, primary_key=True, index=True)
+    else:
+        id = Column(Integer, primary_key=True, index=True)
+        timestamp = Column(BigInteger, index=True)
     lat = Column(Float, nullable=False)
     lon = Column(Float, nullable=False)
-    mic_id = Column(Integer, nullable=False)
\ No newline at end of file
+    mic_id = Column(Integer, nullable=False)
+    __table_args__ = (
+        Index("ix_log_events_mic_id_timestamp", "mic_id", "timestamp", unique=True),
+        # Ids are never reused after deletes, so archived and live logs cannot collide
+        {"postgresql_partition_by": "RANGE (timestamp)"} if LOG_EVENTS_PARTITIONED else {"sqlite_autoincrement": True},
+    )
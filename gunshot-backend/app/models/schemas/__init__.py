@@ -1,6 +1,6 @@
 # app/schemas/__init__.py
-from .gunshot_event import GunshotEventSchema
+from .gunshot_event import GunshotEventSchema, GunshotEventSummarySchema
 from .log_event import LogEventCreate
 from .microphone import MicrophoneSchema
 
-__all__ = ["GunshotEventSchema", "LogEventCreate", "MicrophoneSchema"]
\ No newline at end of file
+__all__ = ["GunshotEventSchema", "GunshotEventSummarySchema", "LogEventCreate", "MicrophoneSchema"]
\ No newline at end of file
@@ -5,4 +5,10 @@ class GunshotEventSchema(BaseModel):
     timestamp: int
     lat: float
     lon: float
-    logs: object
\ No newline at end of file
+    logs: object
+
+class GunshotEventSummarySchema(BaseModel):
+    id: int
+    timestamp: int
+    lat: float
+    lon: float
\ No newline at end of file
@@ -1,38 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import delete
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.log_event import LogEvent
-from app.models.gunshot_event import GunshotEvent
-from app.models.microphone import Microphone
-from app.utils.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.utils.purge import purge_job
 from app.auth.verify_api_key import verify_api_key  # if you still want this protected
 
 router = APIRouter()
 
-@router.delete("/delete_events")
+@router.delete("/delete_events", status_code=202)
 async def delete_all_events_and_microphones(
-    db: AsyncSession = Depends(get_db),
+    fast: bool = Query(False, description="Truncate the tables in one step; only when nothing else is writing"),
     api_key: str = Depends(verify_api_key),  # remove this line if you don’t need auth
 ):
     """
-    DELETE /gunshot_events
-    — Remove every GunshotEvent,LogEvent and every Microphone.
+    DELETE /delete_events
+    — Start removing every GunshotEvent, LogEvent and Microphone in the background.
+      Poll GET /delete_events/status for progress.
     """
-    try:
-        # 1) Bulk‑delete all gunshot events
-        await db.execute(delete(GunshotEvent))
-        # 2) Bulk‑delete all microphones
-        await db.execute(delete(Microphone))
-        # 3) Bulk‑delete all log events
-        await db.execute(delete(LogEvent))
-        # 4) Commit both as one transaction
-        await db.commit()
+    if purge_job.running():
+        raise HTTPException(status_code=409, detail="A delete is already running")
+    return purge_job.start(fast=fast)
 
-        return {
-            "message": "All gunshot events, logs and microphones have been deleted successfully"
-        }
-    except Exception as e:
-        print(f"Error clearing gunshot events & microphones: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
-    finally:
-        await db.close()
+@router.get("/delete_events/status")
+async def delete_events_status(api_key: str = Depends(verify_api_key)):
+    """ Progress of the current (or last) /delete_events job """
+    return purge_job.status()
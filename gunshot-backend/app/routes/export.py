@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+import zlib
+from typing import Literal, Optional
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from app.core.config import settings
+from app.models.log_event import LogEvent
+from app.models.gunshot_event import GunshotEvent
+from app.utils.database import ExportSessionLocal
+from app.utils.gunshot_logs import attach_logs
+
+router = APIRouter()
+
+EXPORT_CHUNK_ROWS = 1000  # Rows fetched from the server-side cursor per round trip
+
+LOG_COLUMNS = ("id", "timestamp", "lat", "lon", "mic_id")
+GUNSHOT_COLUMNS = ("id", "timestamp", "lat", "lon", "logs")
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+active_exports = 0  # Streams currently holding an export connection
+
+
+def encode_rows(rows, columns, fmt, header=False):
+    """ Render one chunk of rows as NDJSON lines or CSV records """
+    if fmt == "ndjson":
+        return "".join(json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n" for row in rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        # Nested values (the gunshot's logs) go into a single JSON-encoded cell
+        writer.writerow([json.dumps(value) if isinstance(value, (list, dict)) else value for value in row])
+    return buffer.getvalue()
+
+
+async def stream_rows(query, columns, fmt, compress, with_logs=False):
+    """
+    Yield the export chunk by chunk from a server-side cursor. The session is
+    opened here rather than through get_db because the response body is
+    produced after the endpoint function has returned. It comes from the
+    export engine, so slow downloads never hold connections other reads need.
+    """
+    global active_exports
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip container
+    header = fmt == "csv"
+
+    async with ExportSessionLocal() as db:
+        try:
+            active_exports += 1
+            result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+            async for rows in result.partitions():
+                if with_logs:
+                    # One link-table lookup per chunk rebuilds the events' logs
+                    events = await attach_logs(db, [row._asdict() for row in rows])
+                    rows = [tuple(event[column] for column in columns) for event in events]
+                chunk = encode_rows(rows, columns, fmt, header=header).encode()
+                header = False
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+            if header:
+                # Empty export: still send the CSV header row
+                chunk = encode_rows([], columns, fmt, header=True).encode()
+                yield compressor.compress(chunk) if compressor else chunk
+            if compressor:
+                yield compressor.flush()
+        except Exception as e:
+            # Headers are already sent, so all we can do is cut the stream short
+            print(f"Error streaming export: {e}")
+            raise
+        finally:
+            active_exports -= 1
+
+
+def export_response(query, columns, fmt, compress, name, with_logs=False):
+    if active_exports >= settings.EXPORT_MAX_CONCURRENT:
+        # Refuse up front: once streaming has started, waiting for a connection would stall the body
+        return JSONResponse(status_code=503, headers={"Retry-After": "10"},
+                            content={"error": "Too many exports in progress, try again later"})
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    if compress:
+        # Compression of the transfer; HTTP clients decode it transparently
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        stream_rows(query, columns, fmt, compress, with_logs),
+        media_type=MEDIA_TYPES[fmt],
+        headers=headers,
+    )
+
+
+@router.get("/export/logs")
+async def export_logs(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False, description="Gzip the stream"),
+    start: Optional[int] = Query(None, description="Only logs with timestamp >= start (microseconds)"),
+    end: Optional[int] = Query(None, description="Only logs with timestamp < end (microseconds)"),
+    mic_id: Optional[int] = Query(None),
+):
+    """ Stream every matching log ordered by (timestamp, id) """
+    query = select(*(getattr(LogEvent, column) for column in LOG_COLUMNS))
+    if start is not None:
+        query = query.where(LogEvent.timestamp >= start)
+    if end is not None:
+        query = query.where(LogEvent.timestamp < end)
+    if mic_id is not None:
+        query = query.where(LogEvent.mic_id == mic_id)
+    query = query.order_by(LogEvent.timestamp, LogEvent.id)
+    return export_response(query, LOG_COLUMNS, format, gzip, "logs")
+
+
+@router.get("/export/gunshot_events")
+async def export_gunshot_events(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False, description="Gzip the stream"),
+    start: Optional[int] = Query(None, description="Only events with timestamp >= start (microseconds)"),
+    end: Optional[int] = Query(None, description="Only events with timestamp < end (microseconds)"),
+):
+    """ Stream every matching gunshot event, oldest first, with its contributing logs """
+    query = select(*(getattr(GunshotEvent, column) for column in GUNSHOT_COLUMNS))
+    if start is not None:
+        query = query.where(GunshotEvent.timestamp >= start)
+    if end is not None:
+        query = query.where(GunshotEvent.timestamp < end)
+    query = query.order_by(GunshotEvent.timestamp, GunshotEvent.id)
+    return export_response(query, GUNSHOT_COLUMNS, format, gzip, "gunshot_events", with_logs=True)
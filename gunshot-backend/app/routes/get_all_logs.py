@@ -1,23 +1,62 @@
-from fastapi import APIRouter, Query, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Query, Depends, HTTPException, Response
 from app.models.schemas.log_event import LogEventCreate
 from app.models.log_event import LogEvent
 from app.utils.database import get_db
+from app.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, after_key
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10_000
+
 @router.get("/get_all_logs", response_model=list[LogEventCreate])
 async def get_all_logs(
+    response: Response,
+    start: Optional[int] = Query(None, description="Only logs with timestamp >= start (microseconds)"),
+    end: Optional[int] = Query(None, description="Only logs with timestamp < end (microseconds)"),
+    mic_id: Optional[int] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description=f"Value of the previous page's {NEXT_CURSOR_HEADER} header"),
     db: AsyncSession = Depends(get_db)
 ):
+    """
+    One page of logs ordered by (timestamp, id). When more rows match, the
+    response carries an X-Next-Cursor header to pass back as `cursor`.
+    """
+    try:
+        cursor_key = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        result = await db.execute(select(LogEvent).order_by(LogEvent.timestamp))
-        logs = result.scalars().all()
-        return logs
+        query = select(LogEvent.id, LogEvent.timestamp, LogEvent.lat, LogEvent.lon, LogEvent.mic_id)
+        if start is not None:
+            query = query.where(LogEvent.timestamp >= start)
+        if end is not None:
+            query = query.where(LogEvent.timestamp < end)
+        if mic_id is not None:
+            query = query.where(LogEvent.mic_id == mic_id)
+        if cursor_key:
+            query = query.where(after_key(LogEvent.timestamp, LogEvent.id, cursor_key))
+
+        # One extra row tells us whether there is a next page without a COUNT
+        result = await db.execute(query.order_by(LogEvent.timestamp, LogEvent.id).limit(limit + 1))
+        rows = result.all()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+        return [
+            {"timestamp": row.timestamp, "lat": row.lat, "lon": row.lon, "mic_id": row.mic_id}
+            for row in rows
+        ]
 
     except Exception as e:
         print(f"Error fetching all logs: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
     finally:
-        await db.close()
\ No newline at end of file
+        await db.close()
@@ -1,21 +1,90 @@
-from fastapi import APIRouter, Query, Depends, HTTPException
+import asyncio
+from typing import Literal, Optional, Union
+from fastapi import APIRouter, Query, Depends, HTTPException, Response
 from app.models.gunshot_event import GunshotEvent
-from app.models.schemas.gunshot_event import GunshotEventSchema
+from app.models.schemas.gunshot_event import GunshotEventSchema, GunshotEventSummarySchema
+from app.utils.archive import archiver
 from app.utils.database import get_db
+from app.utils.gunshot_logs import attach_logs, events_with_mic
+from app.utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, after_key
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 router = APIRouter()
 
-@router.get("/gunshot_events", response_model=list[GunshotEventSchema])
-async def get_gunshot_events(db: AsyncSession = Depends(get_db)):
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+SUMMARY_COLUMNS = (GunshotEvent.id, GunshotEvent.timestamp, GunshotEvent.lat, GunshotEvent.lon)
+
+@router.get("/gunshot_events", response_model=list[Union[GunshotEventSchema, GunshotEventSummarySchema]])
+async def get_gunshot_events(
+    response: Response,
+    since: Optional[int] = Query(None, description="Only events with timestamp >= since (microseconds)"),
+    until: Optional[int] = Query(None, description="Only events with timestamp < until (microseconds)"),
+    mic_id: Optional[int] = Query(None, description="Only events this mic contributed to"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description=f"Value of the previous page's {NEXT_CURSOR_HEADER} header"),
+    fields: Literal["full", "summary"] = Query("full", description="summary skips the logs JSON"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    One page of gunshot events, newest first. When more match, the response
+    carries an X-Next-Cursor header to pass back as `cursor`.
+    """
+    try:
+        cursor_key = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        result = await db.execute(select(GunshotEvent).order_by(GunshotEvent.timestamp.desc()))
-        events = result.scalars().all()
+        columns = SUMMARY_COLUMNS if fields == "summary" else SUMMARY_COLUMNS + (GunshotEvent.logs,)
+        query = select(*columns)
+        if since is not None:
+            query = query.where(GunshotEvent.timestamp >= since)
+        if until is not None:
+            query = query.where(GunshotEvent.timestamp < until)
+        if mic_id is not None:
+            query = query.where(GunshotEvent.id.in_(events_with_mic(mic_id)))
+        if cursor_key:
+            query = query.where(after_key(GunshotEvent.timestamp, GunshotEvent.id, cursor_key, descending=True))
+
+        result = await db.execute(
+            query.order_by(GunshotEvent.timestamp.desc(), GunshotEvent.id.desc()).limit(limit + 1)
+        )
+        rows = result.all()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+        events = [row._asdict() for row in rows]
+        if fields == "full":
+            await attach_logs(db, events)
         return events
     except Exception as e:
         print(f"Error fetching gunshot events: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
     finally:
         await db.close()
-        
\ No newline at end of file
+
+@router.get("/gunshot_events/{event_id}", response_model=GunshotEventSchema)
+async def get_gunshot_event(event_id: int, db: AsyncSession = Depends(get_db)):
+    """ Full detail, including the contributing logs, for one gunshot event (live or archived) """
+    try:
+        result = await db.execute(select(*SUMMARY_COLUMNS, GunshotEvent.logs).where(GunshotEvent.id == event_id))
+        row = result.first()
+        if row is None:
+            event = await asyncio.to_thread(archiver.store.find_event, event_id)
+            if event is None:
+                raise HTTPException(status_code=404, detail="Gunshot event not found")
+            return event
+        [event] = await attach_logs(db, [row._asdict()])
+        return event
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error fetching gunshot event {event_id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        await db.close()
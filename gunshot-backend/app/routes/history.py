@@ -0,0 +1,116 @@
+import asyncio
+import json
+from typing import Optional
+import numpy as np
+from fastapi import APIRouter, Query, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.models.gunshot_event import GunshotEvent
+from app.models.gunshot_event_log import GunshotEventLog
+from app.models.log_event import LogEvent
+from app.utils.archive import archiver, to_columns, concat_columns, first_of_each_row
+from app.utils.database import get_db
+
+router = APIRouter()
+
+DEFAULT_HISTORY_ROWS = 100_000
+MAX_HISTORY_ROWS = 1_000_000
+
+
+def json_column(name, values):
+    """ NaN, -1 and "" are the archive's markers for "missing"; give clients JSON nulls instead """
+    if name == "logs":
+        return [json.loads(value) if value else None for value in values.tolist()]
+    if values.dtype.kind == "f":
+        missing = np.isnan(values)
+    elif name == "gunshot_event_id":
+        missing = values == -1
+    else:
+        return values.tolist()
+    column = values.astype(object)
+    column[missing] = None
+    return column.tolist()
+
+
+def union_columns(kind, archived, live, limit):
+    """
+    Archive + live rows as one set of columns ordered by (timestamp, id).
+    A row can briefly exist in both (archived, not yet deleted); the live copy wins.
+    """
+    combined = concat_columns(kind, [live, archived])
+    order = first_of_each_row(combined)
+    truncated = len(order) > limit
+    order = order[:limit]
+    columns = {name: json_column(name, values[order]) for name, values in combined.items()}
+    return {"count": len(order), "truncated": truncated, "columns": columns}
+
+
+@router.get("/history/logs")
+async def get_log_history(
+    start: int = Query(..., description="Only logs with timestamp >= start (microseconds)"),
+    end: int = Query(..., description="Only logs with timestamp < end (microseconds)"),
+    mic_id: Optional[int] = Query(None),
+    limit: int = Query(DEFAULT_HISTORY_ROWS, ge=1, le=MAX_HISTORY_ROWS),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Logs in [start, end) from the archive and the database together, as
+    columns ({"id": [...], "timestamp": [...], ...}) ordered by timestamp.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+    try:
+        # One row past the limit is enough to tell whether the result was truncated
+        archived = await asyncio.to_thread(archiver.store.scan, "log_events", start, end, mic_id, limit + 1)
+
+        query = (
+            select(LogEvent.id, LogEvent.timestamp, LogEvent.lat, LogEvent.lon, LogEvent.mic_id,
+                   GunshotEventLog.gunshot_event_id)
+            .outerjoin(GunshotEventLog, GunshotEventLog.log_event_id == LogEvent.id)
+            .where(LogEvent.timestamp >= start, LogEvent.timestamp < end)
+            .order_by(LogEvent.timestamp, LogEvent.id)
+            .limit(limit + 1)
+        )
+        if mic_id is not None:
+            query = query.where(LogEvent.mic_id == mic_id)
+        live = to_columns("log_events", (await db.execute(query)).all())
+
+        return union_columns("log_events", archived, live, limit)
+    except Exception as e:
+        print(f"Error fetching log history: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        await db.close()
+
+
+@router.get("/history/gunshot_events")
+async def get_gunshot_event_history(
+    start: int = Query(..., description="Only events with timestamp >= start (microseconds)"),
+    end: int = Query(..., description="Only events with timestamp < end (microseconds)"),
+    limit: int = Query(DEFAULT_HISTORY_ROWS, ge=1, le=MAX_HISTORY_ROWS),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Gunshot events in [start, end) from the archive and the database, as
+    columns. "logs" is only set for events that predate gunshot_event_logs;
+    the logs of the others carry their gunshot_event_id in /history/logs.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+    try:
+        archived = await asyncio.to_thread(archiver.store.scan, "gunshot_events", start, end, None, limit + 1)
+
+        query = (
+            select(GunshotEvent.id, GunshotEvent.timestamp, GunshotEvent.lat, GunshotEvent.lon, GunshotEvent.logs)
+            .where(GunshotEvent.timestamp >= start, GunshotEvent.timestamp < end)
+            .order_by(GunshotEvent.timestamp, GunshotEvent.id)
+            .limit(limit + 1)
+        )
+        live = to_columns("gunshot_events", (await db.execute(query)).all())
+
+        return union_columns("gunshot_events", archived, live, limit)
+    except Exception as e:
+        print(f"Error fetching gunshot event history: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        await db.close()
@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.models.log_event import LogEvent
 from app.models.schemas.log_event import LogEventCreate
-from app.utils.database import get_db
+from app.utils.database import get_db, insert_logs, upsert
 from app.utils.debounce import handle_debounce
+from app.utils.stream_detector import stream_detector
+from app.utils.ingest_buffer import ingest_buffer
+from app.utils.microphone_registry import microphone_registry, moved_beyond_threshold
 from app.models.microphone import Microphone
-from app.utils.websocket_manager import manager
+from app.utils.sensor_updates import sensor_scheduler
 from app.auth.verify_api_key import verify_api_key
+from app.core.config import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import JSONResponse
 from datetime import datetime, timezone
 from sqlalchemy import select
-from geopy.distance import geodesic
 import asyncio
 
 router = APIRouter()
@@ -21,43 +24,29 @@ async def log_event(event: LogEventCreate, db: AsyncSession = Depends(get_db),
     global last_trigger_time, debounce_task
 
     try:
-        # ✅ Validate latitude & longitude
-        if not (-90 <= event.lat <= 90):
-            return JSONResponse(status_code=400, content={"error": f"Invalid latitude: {event.lat}"})
-        if not (-180 <= event.lon <= 180):
-            return JSONResponse(status_code=400, content={"error": f"Invalid longitude: {event.lon}"})
-
-        # ✅ Validate timestamp (convert from microseconds to seconds)
-        timestamp_sec = event.timestamp / 1e6
-        now = datetime.now(timezone.utc).timestamp()
-
-        if timestamp_sec <= 0 or timestamp_sec > now + (365 * 24 * 60 * 60):  # Must not be >1 year ahead
-            return JSONResponse(status_code=400, content={"error": f"Invalid timestamp: {event.timestamp}"})
-
-        # ✅ Offload DB check for duplicate logs (Avoid blocking request)
-        existing_log = await db.execute(
-            select(LogEvent).where(LogEvent.mic_id == event.mic_id, LogEvent.timestamp == event.timestamp)
-        )
-        if existing_log.scalar_one_or_none():
+        # ✅ Validate latitude, longitude & timestamp
+        error = validate_log_event(event)
+        if error:
+            return JSONResponse(status_code=400, content={"error": error})
+
+        # ✅ Group-committed INSERT; returns once the batch holding this log is committed.
+        # The (mic_id, timestamp) unique index rejects duplicates
+        [log_id] = await ingest_buffer.submit([event])
+        if log_id is None:
             return {"message": "Duplicate log detected"}
 
-        # ✅ Create log entry asynchronously
-        log_entry = LogEvent(**event.dict())
-        db.add(log_entry)
-        await db.commit()
-
         # ✅ Offload microphone location update
-        should_broadcast = await update_microphone_location(db, event)
+        changed_mics = await update_microphone_location(db, event)
 
-        # ✅ Broadcast sensor update if needed (Offloaded)
-        if should_broadcast:
-            asyncio.create_task(broadcast_sensor_update(db))
+        # ✅ Coalesced sensor delta broadcast for the moved/new mic
+        sensor_scheduler.mark_dirty(changed_mics)
 
         #print(f"log timestamp: {event.timestamp}")
-        # ✅ Debounced gunshot detection
-        await handle_debounce(event.timestamp)
+        # ✅ Streaming gunshot detection on the committed log
+        await stream_detector.feed([LogEvent(id=log_id, **event.dict())])
+        await handle_debounce()
 
-        return {"message": "Log event recorded", "id": log_entry.id}
+        return {"message": "Log event recorded", "id": log_id}
 
     except Exception as e:
         print(f"Unhandled error in log_event: {e}")
@@ -65,48 +54,134 @@ async def log_event(event: LogEventCreate, db: AsyncSession = Depends(get_db),
     finally:
         await db.close()
 
-async def update_microphone_location(db: AsyncSession, event: LogEventCreate):
-    """ Update microphone location if moved significantly, and determine if broadcast is needed """
+@router.post("/log_events")
+async def log_events(events: list[LogEventCreate], db: AsyncSession = Depends(get_db),
+                     api_key: str = Depends(verify_api_key)):
+    """ Ingest a batch of buffered sensor logs in a single transaction """
+    accepted = []
+    rejected = []
+
+    if len(events) > settings.LOG_EVENTS_MAX_BATCH:
+        await db.close()
+        return JSONResponse(status_code=413, content={
+            "error": f"Batch of {len(events)} logs exceeds the limit of {settings.LOG_EVENTS_MAX_BATCH}"
+        })
+
     try:
-        existing_mic = await db.execute(
-            select(Microphone).where(Microphone.mic_id == event.mic_id)
+        # ✅ Validate every log up front and drop duplicates within the batch
+        candidates = []
+        seen = set()
+        for index, event in enumerate(events):
+            error = validate_log_event(event)
+            if error:
+                rejected.append({"index": index, "error": error})
+                continue
+            key = (event.mic_id, event.timestamp)
+            if key in seen:
+                rejected.append({"index": index, "error": "Duplicate log detected"})
+                continue
+            seen.add(key)
+            candidates.append((index, event))
+
+        if not candidates:
+            return {"accepted": accepted, "rejected": rejected}
+
+        # ✅ One INSERT (or COPY on Postgres) for the whole batch; rows hitting the unique index are skipped
+        inserted = await insert_logs(db, [event.dict() for _, event in candidates])
+        inserted_ids = {(mic_id, timestamp): log_id for log_id, mic_id, timestamp in inserted}
+
+        new_entries = []
+        for index, event in candidates:
+            log_id = inserted_ids.get((event.mic_id, event.timestamp))
+            if log_id is None:
+                rejected.append({"index": index, "error": "Duplicate log detected"})
+                continue
+            new_entries.append((index, event, log_id))
+
+        if not new_entries:
+            await db.rollback()
+            rejected.sort(key=lambda item: item["index"])
+            return {"accepted": accepted, "rejected": rejected}
+
+        # ✅ Microphone updates ride along in the same transaction
+        changed_mics = await update_microphone_locations(
+            db, [event for _, event, _ in new_entries]
         )
-        mic_record = existing_mic.scalar_one_or_none()
-
-        if mic_record:
-            # Compute distance only if location changes
-            old_location = (mic_record.lat, mic_record.lon)
-            new_location = (event.lat, event.lon)
-            distance = geodesic(old_location, new_location).meters
-
-            if distance > 10:
-                mic_record.lat, mic_record.lon = event.lat, event.lon
-                await db.commit()  # Commit only when needed
-                return True
-        else:
-            # Insert new microphone record
-            new_mic = Microphone(mic_id=event.mic_id, lat=event.lat, lon=event.lon)
-            db.add(new_mic)
-            await db.commit()
-            return True
-        
-        return False
+
+        await db.commit()
+        microphone_registry.update_many(changed_mics)
+
+        accepted = [{"index": index, "id": log_id} for index, _, log_id in new_entries]
+        rejected.sort(key=lambda item: item["index"])
+
+        sensor_scheduler.mark_dirty(changed_mics)
+
+        # ✅ Streaming gunshot detection, fed once with the whole batch
+        await stream_detector.feed(
+            [LogEvent(id=log_id, **event.dict()) for _, event, log_id in new_entries]
+        )
+        await handle_debounce()
+
+        return {"accepted": accepted, "rejected": rejected}
+
     except Exception as e:
         await db.rollback()
-        raise e
+        print(f"Unhandled error in log_events: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
     finally:
         await db.close()
 
-async def broadcast_sensor_update(db: AsyncSession):
-    """ Asynchronously broadcast updated sensor list """
-    try:
-        sensors_result = await db.execute(select(Microphone))
-        sensors = sensors_result.scalars().all()
+def validate_log_event(event: LogEventCreate):
+    """ Return an error message if the log has an invalid position or timestamp """
+    if not (-90 <= event.lat <= 90):
+        return f"Invalid latitude: {event.lat}"
+    if not (-180 <= event.lon <= 180):
+        return f"Invalid longitude: {event.lon}"
+
+    # Convert from microseconds to seconds
+    timestamp_sec = event.timestamp / 1e6
+    now = datetime.now(timezone.utc).timestamp()
+
+    if timestamp_sec <= 0 or timestamp_sec > now + (365 * 24 * 60 * 60):  # Must not be >1 year ahead
+        return f"Invalid timestamp: {event.timestamp}"
+
+    return None
+
+async def update_microphone_locations(db: AsyncSession, events: list[LogEventCreate]):
+    """ Stage location changes for every microphone in a batch without committing.
+        Returns {mic_id: (lat, lon)} for the mics that were added or moved. """
+    changed = {}
+    for event in sorted(events, key=lambda e: e.timestamp):
+        # Compare against a move staged earlier in this batch before the registry
+        staged = changed.get(event.mic_id)
+        if staged is not None:
+            moved = moved_beyond_threshold(staged, (event.lat, event.lon))
+        else:
+            moved = microphone_registry.has_moved(event.mic_id, event.lat, event.lon)
+        if moved:
+            changed[event.mic_id] = (event.lat, event.lon)
+
+    for mic_id, (lat, lon) in changed.items():
+        await db.execute(upsert(Microphone, ["mic_id"], mic_id=mic_id, lat=lat, lon=lon))
+
+    return changed
 
-        sensor_list = [{"mic_id": mic.mic_id, "lat": mic.lat, "lon": mic.lon} for mic in sensors]
+async def update_microphone_location(db: AsyncSession, event: LogEventCreate):
+    """ Update microphone location if moved significantly.
+        Returns {mic_id: (lat, lon)} of what changed for the sensor delta """
+    try:
+        # Answered from memory; the DB is only touched for new or moved mics
+        if not microphone_registry.has_moved(event.mic_id, event.lat, event.lon):
+            return {}
 
-        await manager.broadcast({"type": "sensor_update", "sensors": sensor_list})
+        await db.execute(
+            upsert(Microphone, ["mic_id"], mic_id=event.mic_id, lat=event.lat, lon=event.lon)
+        )
+        await db.commit()
+        microphone_registry.update(event.mic_id, event.lat, event.lon)
+        return {event.mic_id: (event.lat, event.lon)}
     except Exception as e:
-        raise e 
+        await db.rollback()
+        raise e
     finally:
-        await db.close()
\ No newline at end of file
+        await db.close()
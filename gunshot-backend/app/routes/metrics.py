@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from app.utils.localization_executor import localization_executor
+from app.utils.ingest_buffer import ingest_buffer
+from app.utils.websocket_manager import manager
+from app.utils.sensor_updates import sensor_scheduler
+from app.utils.retention import retention_job
+from app.utils.archive import archiver
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def get_metrics():
+    """ In-process counters for the background pipelines """
+    return {
+        "ingest": ingest_buffer.stats(),
+        "localization": localization_executor.stats(),
+        "websocket": manager.stats(),
+        "sensor_broadcasts": sensor_scheduler.stats(),
+        "retention": retention_job.stats(),
+        "archive": archiver.stats(),
+    }
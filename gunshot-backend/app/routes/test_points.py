@@ -3,7 +3,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from app.models.log_event import LogEvent
 from app.models.microphone import Microphone
-from app.utils.database import get_db
+from app.utils.database import get_db, insert_ignore_duplicates, upsert
+from app.utils.microphone_registry import microphone_registry
+from app.utils.sensor_updates import sensor_scheduler
 from fastapi.responses import JSONResponse
 
 import random
@@ -40,35 +42,29 @@ async def generate_test_logs(db: AsyncSession = Depends(get_db)):
 
         logs = []
         mic_ids = []
+        mic_locations = {}
 
         for i in range(4):
             lat, lon = offset_coordinates(base_lat, base_lon, 60)
             mic_id = max_mic_id + i + 1
 
-            # ✅ Check if log already exists
-            existing_log = await db.execute(
-                select(LogEvent).where(LogEvent.mic_id == mic_id, LogEvent.timestamp == timestamp)
+            # ✅ Insert LogEvent, skipping duplicates via the unique index
+            inserted = await db.execute(
+                insert_ignore_duplicates(LogEvent)
+                .values(mic_id=mic_id, lat=lat, lon=lon, timestamp=timestamp)
+                .returning(LogEvent.id)
             )
-            if existing_log.scalar_one_or_none():
+            if inserted.scalar_one_or_none() is None:
                 continue  # Skip duplicates
-
-            # ✅ Insert LogEvent
-            log = LogEvent(mic_id=mic_id, lat=lat, lon=lon, timestamp=timestamp)
-            db.add(log)
             mic_ids.append(mic_id)
 
             # ✅ Insert/Update Microphone
-            existing_mic = await db.execute(select(Microphone).where(Microphone.mic_id == mic_id))
-            mic_record = existing_mic.scalar_one_or_none()
-
-            if mic_record:
-                mic_record.lat = lat
-                mic_record.lon = lon
-            else:
-                mic = Microphone(mic_id=mic_id, lat=lat, lon=lon)
-                db.add(mic)
+            await db.execute(upsert(Microphone, ["mic_id"], mic_id=mic_id, lat=lat, lon=lon))
+            mic_locations[mic_id] = (lat, lon)
 
         await db.commit()
+        microphone_registry.update_many(mic_locations)
+        sensor_scheduler.mark_dirty(mic_locations)
 
         return JSONResponse(status_code=201, content={
             "message": "4 synthetic logs and microphones inserted.",
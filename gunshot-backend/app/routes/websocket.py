@@ -1,5 +1,8 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.utils.websocket_manager import manager
+from app.utils.sensor_updates import send_sensor_snapshot
+from app.utils.subscriptions import parse_subscription
+import json
 import logging
 logger = logging.getLogger(__name__)
 
@@ -8,6 +11,8 @@ router = APIRouter()
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    # New clients start from a full snapshot and then apply versioned deltas
+    await send_sensor_snapshot(websocket)
     try:
         while True:
             try:
@@ -15,7 +20,32 @@ async def websocket_endpoint(websocket: WebSocket):
                 print(f"Received: {message}")
             except WebSocketDisconnect:
                 break
+
+            try:
+                request = json.loads(message)
+            except ValueError:
+                continue
+            if not isinstance(request, dict):
+                continue
+
+            if request.get("type") == "resync":
+                await send_sensor_snapshot(websocket)
+            elif request.get("type") == "subscribe":
+                # {"type": "subscribe", "bbox": {...} | "polygon": [[lat, lon], ...], "types": ["gunshot", "sensor"]}
+                try:
+                    subscription = parse_subscription(request)
+                except ValueError as e:
+                    await manager.send(websocket, {"type": "error", "error": str(e)})
+                    continue
+                manager.subscribe(websocket, subscription)
+                await manager.send(websocket, {"type": "subscribed", **subscription.describe()})
+                # The visible sensor set changed, so start the client from a fresh snapshot
+                await send_sensor_snapshot(websocket)
+            elif request.get("type") == "unsubscribe":
+                manager.subscribe(websocket, None)
+                await manager.send(websocket, {"type": "subscribed", "bbox": None, "polygon": None, "types": None})
+                await send_sensor_snapshot(websocket)
     except Exception as e:
         logger.error(f"WebSocket Error: {e}")
     finally:
-        await manager.disconnect(websocket)
\ No newline at end of file
+        await manager.disconnect(websocket)
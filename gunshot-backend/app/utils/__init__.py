@@ -2,11 +2,13 @@
 from .database import get_db, create_tables
 from .websocket_manager import manager
 from .debounce import debounce_detect_gunshots, handle_debounce
+from .stream_detector import stream_detector
 from .estimate_gunshot_location import estimate_gunshot_location
+from .localization_executor import localization_executor
 
 __all__ = [
     "get_db", "create_tables", "manager", 
-    "debounce_detect_gunshots", "handle_debounce", 
+    "debounce_detect_gunshots", "handle_debounce", "stream_detector",
     "update_microphone_location",
-    "estimate_gunshot_location"
+    "estimate_gunshot_location", "localization_executor"
 ]
\ No newline at end of file
@@ -0,0 +1,439 @@
+import asyncio
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import select, delete, insert, exists, func, text, union, or_, table, column
+from sqlalchemy.orm import aliased
+from app.core.config import settings
+from app.models.gunshot_event import GunshotEvent
+from app.models.gunshot_event_log import GunshotEventLog
+from app.models.log_event import LogEvent
+from app.utils.database import AsyncSessionLocal, engine
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:  # Optional; archives fall back to compressed .npz
+    pyarrow = None
+
+DAY_MICROSECONDS = 86_400_000_000
+EPOCH = date(1970, 1, 1)
+ARCHIVE_DELETE_CHUNK = 5000  # Ids per DELETE once a day's file is safely written
+
+# Column layout of the archive files; missing links / locations / legacy logs are stored as -1 / NaN / ""
+ARCHIVE_COLUMNS = {
+    "log_events": {"id": np.int64, "timestamp": np.int64, "lat": np.float64, "lon": np.float64,
+                   "mic_id": np.int64, "gunshot_event_id": np.int64},
+    # logs: the JSON copy events written before gunshot_event_logs carry instead of link rows
+    "gunshot_events": {"id": np.int64, "timestamp": np.int64, "lat": np.float64, "lon": np.float64,
+                       "logs": np.str_},
+}
+
+
+def day_of(timestamp: int) -> date:
+    return EPOCH + timedelta(days=timestamp // DAY_MICROSECONDS)
+
+
+def day_start(day: date) -> int:
+    return (day - EPOCH).days * DAY_MICROSECONDS
+
+
+def missing_value(dtype):
+    if np.issubdtype(dtype, np.floating):
+        return np.nan
+    return "" if dtype is np.str_ else -1
+
+
+def json_text(value):
+    """ A JSON column's value as stored in a text column ("" for none) """
+    if not value:
+        return ""
+    return value if isinstance(value, str) else json.dumps(value, separators=(",", ":"))
+
+
+def to_columns(kind, rows):
+    """ Rows (tuples in ARCHIVE_COLUMNS order) -> {name: typed numpy array} """
+    columns = ARCHIVE_COLUMNS[kind]
+    if not rows:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in columns.items()}
+    transposed = list(zip(*rows))
+    arrays = {}
+    for (name, dtype), values in zip(columns.items(), transposed):
+        if dtype is np.str_:
+            values = [json_text(value) for value in values]
+        fill = missing_value(dtype)
+        arrays[name] = np.array([fill if value is None else value for value in values], dtype=dtype)
+    return arrays
+
+
+def first_of_each_row(columns):
+    """
+    Indices of the first occurrence of every (id, timestamp) pair, ordered by
+    (timestamp, id). Keying on both keeps rows whose ids collide (a table that
+    predates AUTOINCREMENT can hand an archived id out again) apart.
+    """
+    ids, timestamps = columns["id"], columns["timestamp"]
+    order = np.lexsort((ids, timestamps))  # Stable, so earlier parts win ties
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (ids[order][1:] != ids[order][:-1]) | (timestamps[order][1:] != timestamps[order][:-1])
+    return order[keep]
+
+
+def concat_columns(kind, parts):
+    parts = [part for part in parts if len(part["id"])]
+    if not parts:
+        return to_columns(kind, [])
+    return {name: np.concatenate([part[name] for part in parts]) for name in ARCHIVE_COLUMNS[kind]}
+
+
+def optional_float(value):
+    return None if np.isnan(value) else float(value)
+
+
+def held_events(cutoff):
+    """
+    Ids of events that stay in the database for now because the event or one
+    of its logs is at or past cutoff. Their logs stay with them, so an event
+    and all of its logs are archived in the same run. A shot's logs span
+    about a second, so only the day after cutoff needs looking at.
+    """
+    horizon = cutoff + DAY_MICROSECONDS
+    # correlate(None): used inside queries on the same tables, it must not refer to their rows
+    return union(
+        select(GunshotEventLog.gunshot_event_id)
+        .join(LogEvent, LogEvent.id == GunshotEventLog.log_event_id)
+        .where(LogEvent.timestamp >= cutoff, LogEvent.timestamp < horizon)
+        .correlate(None),
+        select(GunshotEvent.id)
+        .where(GunshotEvent.timestamp >= cutoff, GunshotEvent.timestamp < horizon)
+        .correlate(None),
+    )
+
+
+def log_partition(name):
+    return table(name, column("id"), column("timestamp"), column("lat"), column("lon"), column("mic_id"))
+
+
+class ArchiveStore:
+    """
+    Per-day columnar files under ARCHIVE_DIR/<table>/<YYYY-MM-DD>.parquet
+    (zstd, when pyarrow is installed) or .npz (compressed NumPy) otherwise.
+    Its methods block on disk and (de)compression; async callers run them
+    with asyncio.to_thread so the event loop keeps serving ingest and WebSockets.
+    """
+
+    def __init__(self, root=settings.ARCHIVE_DIR):
+        self.root = root
+        self.extension = ".parquet" if pyarrow is not None else ".npz"
+
+    def path(self, kind, day: date, extension=None):
+        return os.path.join(self.root, kind, f"{day:%Y-%m-%d}{extension or self.extension}")
+
+    def existing_path(self, kind, day: date):
+        for extension in (".parquet", ".npz"):
+            path = self.path(kind, day, extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def read_day(self, kind, day: date):
+        path = self.existing_path(kind, day)
+        if path is None:
+            return to_columns(kind, [])
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                stored = {name: data[name] for name in data.files}
+        elif pyarrow is None:
+            raise RuntimeError(f"{path} needs pyarrow to be read")
+        else:
+            table = parquet.read_table(path)
+            stored = {name: table.column(name).to_numpy() for name in table.column_names}
+        # Files written before a column existed get it filled with the missing marker
+        length = len(stored["id"])
+        return {
+            name: np.asarray(stored[name], dtype=dtype) if name in stored
+            else np.full(length, missing_value(dtype), dtype=dtype)
+            for name, dtype in ARCHIVE_COLUMNS[kind].items()
+        }
+
+    def write_day(self, kind, day: date, columns):
+        """ Merge columns into the day's file (late rows for an archived day land here too) """
+        merged = concat_columns(kind, [self.read_day(kind, day), columns])
+        order = first_of_each_row(merged)  # A retried archive run may repeat rows
+        merged = {name: values[order] for name, values in merged.items()}
+
+        old_path = self.existing_path(kind, day)
+        path = self.path(kind, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = path + ".tmp"
+        if pyarrow is not None:
+            parquet.write_table(pyarrow.table(merged), temporary, compression="zstd")
+        else:
+            with open(temporary, "wb") as handle:
+                np.savez_compressed(handle, **merged)
+        os.replace(temporary, path)  # Readers see either the old file or the complete new one
+        if old_path and old_path != path:
+            os.remove(old_path)
+
+    def scan(self, kind, start: int, end: int, mic_id=None, limit=None):
+        """
+        Archived rows with start <= timestamp < end, filtered with vectorized
+        masks. Days are read oldest first and every row of a day sorts after
+        the days before it, so reading stops once limit rows are in hand.
+        """
+        parts = []
+        found = 0
+        for day in self.days(kind):
+            if not day_of(start) <= day <= day_of(end - 1):
+                continue
+            if limit is not None and found >= limit:
+                break
+            columns = self.read_day(kind, day)
+            mask = (columns["timestamp"] >= start) & (columns["timestamp"] < end)
+            if mic_id is not None:
+                mask &= columns["mic_id"] == mic_id
+            parts.append({name: values[mask] for name, values in columns.items()})
+            found += len(parts[-1]["id"])
+        return concat_columns(kind, parts)
+
+    def find_event(self, event_id):
+        """ An archived gunshot event in the /gunshot_events/{id} shape, or None """
+        for day in reversed(self.days("gunshot_events")):
+            events = self.read_day("gunshot_events", day)
+            [matches] = np.nonzero(events["id"] == event_id)
+            if not len(matches):
+                continue
+            index = matches[0]
+            timestamp = int(events["timestamp"][index])
+            if events["logs"][index]:
+                logs = json.loads(events["logs"][index])
+            else:
+                # A shot's logs arrive within moments of it, so the days around it hold all of them
+                nearby = self.scan("log_events", timestamp - DAY_MICROSECONDS, timestamp + DAY_MICROSECONDS)
+                [rows] = np.nonzero(nearby["gunshot_event_id"] == event_id)
+                logs = [{
+                    "id": int(nearby["id"][row]),
+                    "timestamp": int(nearby["timestamp"][row]),
+                    "lat": optional_float(nearby["lat"][row]),
+                    "lon": optional_float(nearby["lon"][row]),
+                    "mic_id": int(nearby["mic_id"][row]),
+                } for row in rows]
+            return {
+                "id": event_id,
+                "timestamp": timestamp,
+                "lat": optional_float(events["lat"][index]),
+                "lon": optional_float(events["lon"][index]),
+                "logs": logs,
+            }
+        return None
+
+    def days(self, kind):
+        """ Days that have an archive file, oldest first """
+        directory = os.path.join(self.root, kind)
+        if not os.path.isdir(directory):
+            return []
+        days = set()
+        for filename in os.listdir(directory):
+            stem, extension = os.path.splitext(filename)
+            if extension in (".parquet", ".npz"):
+                try:
+                    days.add(datetime.strptime(stem, "%Y-%m-%d").date())
+                except ValueError:
+                    continue
+        return sorted(days)
+
+
+class LogArchiver:
+    """
+    Moves whole UTC days of logs and gunshot events older than
+    ARCHIVE_AFTER_DAYS out of the database into the ArchiveStore.
+
+    A day is written to its file first and only then deleted, by the ids that
+    were written, so a crash in between leaves rows in both places (the read
+    API drops the duplicates) rather than losing them. A day that still has
+    its own Postgres partition is written out while still attached, then
+    detached and dropped in a short transaction that also archives any rows
+    that arrived in between; later inserts for that day go to the default
+    partition and are picked up on the next run. An event and its logs are
+    archived together: while any of them is still at or past the cutoff,
+    all of them stay in the database (see held_events).
+    """
+
+    def __init__(self, after_days=settings.ARCHIVE_AFTER_DAYS, store=None):
+        self.after_days = after_days
+        self.store = store or ArchiveStore()
+
+        self.days_archived = 0
+        self.logs_archived = 0
+        self.events_archived = 0
+
+    @property
+    def enabled(self):
+        return self.after_days > 0
+
+    def cutoff(self):
+        """ Start of the first UTC day that stays in the database """
+        horizon = datetime.now(timezone.utc) - timedelta(days=self.after_days)
+        return day_start(horizon.date())
+
+    async def run_once(self, partitions=()):
+        """ partitions: (name, day) of the daily log_events partitions, when the table is partitioned """
+        cutoff = self.cutoff()
+        await self.link_legacy_logs(cutoff)
+        await self.archive_partitions(cutoff, partitions)
+        await self.archive_logs(cutoff)
+        await self.archive_events(cutoff)
+
+    async def link_legacy_logs(self, cutoff):
+        """
+        Events written before gunshot_event_logs existed only list their logs in
+        the JSON column. Give those about to be archived link rows for the logs
+        still in the database, so the logs are archived with their gunshot_event_id.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(GunshotEvent.id, GunshotEvent.logs)
+                .where(GunshotEvent.logs.isnot(None),
+                       GunshotEvent.timestamp < cutoff + DAY_MICROSECONDS,  # Logs can trail their event
+                       ~exists().where(GunshotEventLog.gunshot_event_id == GunshotEvent.id))
+            )
+            owners = {}
+            for event_id, logs in result.all():
+                for log in logs or []:
+                    owners.setdefault(log["id"], event_id)  # A log belongs to at most one event
+
+            log_ids = list(owners)
+            links = []
+            for offset in range(0, len(log_ids), ARCHIVE_DELETE_CHUNK):
+                chunk = log_ids[offset:offset + ARCHIVE_DELETE_CHUNK]
+                present = set((await db.execute(select(LogEvent.id).where(LogEvent.id.in_(chunk)))).scalars())
+                linked = set((await db.execute(
+                    select(GunshotEventLog.log_event_id).where(GunshotEventLog.log_event_id.in_(chunk))
+                )).scalars())
+                links += [
+                    {"gunshot_event_id": owners[log_id], "log_event_id": log_id}
+                    for log_id in chunk if log_id in present and log_id not in linked
+                ]
+            if links:
+                await db.execute(insert(GunshotEventLog), links)
+                await db.commit()
+
+    async def archive_partitions(self, cutoff, partitions):
+        held = held_events(cutoff)
+        for name, day in partitions:
+            if day_start(day + timedelta(days=1)) > cutoff:
+                continue
+            partition = log_partition(name)
+            rows = (
+                select(partition.c.id, partition.c.timestamp, partition.c.lat, partition.c.lon,
+                       partition.c.mic_id, GunshotEventLog.gunshot_event_id)
+                .outerjoin(GunshotEventLog, GunshotEventLog.log_event_id == partition.c.id)
+                .where(or_(GunshotEventLog.gunshot_event_id.is_(None),
+                           GunshotEventLog.gunshot_event_id.not_in(held)))
+            )
+            # Write the file while the partition is still attached and writable
+            async with engine.begin() as conn:
+                columns = to_columns("log_events", (await conn.execute(rows)).all())
+            await asyncio.to_thread(self.store.write_day, "log_events", day, columns)
+            written = len(columns["id"])
+
+            # Then detach, pick up the (rare) rows that arrived meanwhile, and drop it. If this
+            # fails the partition stays attached and the file only holds rows the next run merges
+            async with engine.begin() as conn:
+                await conn.execute(text(f"ALTER TABLE log_events DETACH PARTITION {name}"))
+                after = int(columns["id"].max()) if written else -1
+                late = to_columns("log_events", (await conn.execute(rows.where(partition.c.id > after))).all())
+                if len(late["id"]):
+                    await asyncio.to_thread(self.store.write_day, "log_events", day, late)
+                    written += len(late["id"])
+                # Logs of held events move to the default partition, keeping their ids and links
+                kept = (
+                    select(partition.c.id, partition.c.timestamp, partition.c.lat, partition.c.lon, partition.c.mic_id)
+                    .where(exists().where(GunshotEventLog.log_event_id == partition.c.id,
+                                          GunshotEventLog.gunshot_event_id.in_(held)))
+                )
+                await conn.execute(insert(LogEvent).from_select(["id", "timestamp", "lat", "lon", "mic_id"], kept))
+                await conn.execute(delete(GunshotEventLog).where(
+                    GunshotEventLog.log_event_id.in_(select(partition.c.id)),
+                    GunshotEventLog.gunshot_event_id.not_in(held),
+                ))
+                await conn.execute(text(f"DROP TABLE {name}"))
+            self.days_archived += 1
+            self.logs_archived += written
+            print(f"Archived log partition {name} ({written} rows)")
+
+    async def archive_logs(self, cutoff):
+        link = aliased(GunshotEventLog)  # The row queries below also join gunshot_event_logs
+        archivable = (
+            LogEvent.timestamp < cutoff,
+            ~exists().where(link.log_event_id == LogEvent.id, link.gunshot_event_id.in_(held_events(cutoff))),
+        )
+        while True:
+            async with AsyncSessionLocal() as db:
+                oldest = await db.scalar(select(func.min(LogEvent.timestamp)).where(*archivable))
+                if oldest is None:
+                    return
+                day = day_of(oldest)
+                result = await db.execute(
+                    select(LogEvent.id, LogEvent.timestamp, LogEvent.lat, LogEvent.lon, LogEvent.mic_id,
+                           GunshotEventLog.gunshot_event_id)
+                    .outerjoin(GunshotEventLog, GunshotEventLog.log_event_id == LogEvent.id)
+                    .where(*archivable,
+                           LogEvent.timestamp >= day_start(day),
+                           LogEvent.timestamp < day_start(day + timedelta(days=1)))
+                )
+                columns = to_columns("log_events", result.all())
+
+            await asyncio.to_thread(self.store.write_day, "log_events", day, columns)
+            log_ids = columns["id"].tolist()
+            for offset in range(0, len(log_ids), ARCHIVE_DELETE_CHUNK):
+                chunk = log_ids[offset:offset + ARCHIVE_DELETE_CHUNK]
+                async with AsyncSessionLocal() as db:
+                    await db.execute(delete(GunshotEventLog).where(GunshotEventLog.log_event_id.in_(chunk)))
+                    await db.execute(delete(LogEvent).where(
+                        LogEvent.timestamp < cutoff, LogEvent.id.in_(chunk)
+                    ))
+                    await db.commit()
+            self.days_archived += 1
+            self.logs_archived += len(log_ids)
+
+    async def archive_events(self, cutoff):
+        archivable = (GunshotEvent.timestamp < cutoff, GunshotEvent.id.not_in(held_events(cutoff)))
+        while True:
+            async with AsyncSessionLocal() as db:
+                oldest = await db.scalar(select(func.min(GunshotEvent.timestamp)).where(*archivable))
+                if oldest is None:
+                    return
+                day = day_of(oldest)
+                result = await db.execute(
+                    select(GunshotEvent.id, GunshotEvent.timestamp, GunshotEvent.lat, GunshotEvent.lon,
+                           GunshotEvent.logs)
+                    .where(*archivable,
+                           GunshotEvent.timestamp >= day_start(day),
+                           GunshotEvent.timestamp < day_start(day + timedelta(days=1)))
+                )
+                columns = to_columns("gunshot_events", result.all())
+
+            await asyncio.to_thread(self.store.write_day, "gunshot_events", day, columns)
+            event_ids = columns["id"].tolist()
+            for offset in range(0, len(event_ids), ARCHIVE_DELETE_CHUNK):
+                chunk = event_ids[offset:offset + ARCHIVE_DELETE_CHUNK]
+                async with AsyncSessionLocal() as db:
+                    await db.execute(delete(GunshotEventLog).where(GunshotEventLog.gunshot_event_id.in_(chunk)))
+                    await db.execute(delete(GunshotEvent).where(GunshotEvent.id.in_(chunk)))
+                    await db.commit()
+            self.events_archived += len(event_ids)
+
+    def stats(self):
+        return {
+            "after_days": self.after_days,
+            "format": self.store.extension.lstrip("."),
+            "directory": self.store.root,
+            "days_archived": self.days_archived,
+            "logs_archived": self.logs_archived,
+            "events_archived": self.events_archived,
+        }
+
+
+archiver = LogArchiver()
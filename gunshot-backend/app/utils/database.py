@@ -1,22 +1,115 @@
-import os
+from sqlalchemy import event, text, inspect, MetaData, Insert, Update, Delete
+from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+from app.core.config import settings
 from app.models.base import Base
+from app.models.log_event import LogEvent
+from app.models.gunshot_event import GunshotEvent
 
 
-DB_TYPE = os.getenv("DB_TYPE", "sqlite")
+def sqlite_pragmas(profile=settings.SQLITE_PROFILE):
+    """ PRAGMAs run on every new SQLite connection for the given profile """
+    if profile != "tuned":
+        return []
+    return [
+        "PRAGMA journal_mode=WAL",  # Readers no longer block the writer (or each other)
+        "PRAGMA synchronous=NORMAL",  # WAL stays consistent; only the last commits can be lost on power failure
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",  # Negative means KiB rather than pages
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+    ]
+
+def sqlite_engines(path=settings.SQLITE_PATH, profile=settings.SQLITE_PROFILE,
+                   read_pool_size=settings.SQLITE_READ_POOL_SIZE):
+    """
+    (write_engine, read_engine) for a SQLite file. The tuned profile gives
+    writes a single pooled connection, so they are serialized in the app
+    instead of fighting over the database lock, and reads their own small
+    pool. The default profile is one plain engine for both.
+    """
+    url = f"sqlite+aiosqlite:///{path}"
+    pragmas = sqlite_pragmas(profile)
+    if not pragmas:
+        engine = create_async_engine(url, echo=False)
+        return engine, engine
+
+    write_engine = sqlite_pooled_engine(path, 1, pragmas)
+    read_engine = sqlite_pooled_engine(path, read_pool_size, pragmas)
+    return write_engine, read_engine
+
+def sqlite_pooled_engine(path, pool_size, pragmas):
+    """ Engine with a fixed pool of pool_size connections, each set up with the pragmas """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", echo=False, pool_size=pool_size, max_overflow=0)
+    event.listen(engine.sync_engine, "connect", apply_pragmas(pragmas))
+    return engine
+
+def apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+    return on_connect
+
+def session_factory(write_engine, read_engine):
+    """ Sessions that send writes to write_engine and plain reads to read_engine """
+    if read_engine is write_engine:
+        return sessionmaker(bind=write_engine, class_=AsyncSession, expire_on_commit=False)
+
+    class RoutingSession(Session):
+        def get_bind(self, mapper=None, clause=None, **kwargs):
+            # Once a session has written, keep it on the writer so it reads its own changes
+            if self._flushing or isinstance(clause, (Insert, Update, Delete)) or self.info.get("writer"):
+                self.info["writer"] = True
+                return write_engine.sync_engine
+            return read_engine.sync_engine
+
+    return sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False)
+
+
+def postgres_engine(config=settings):
+    """ asyncpg engine whose pool and statement caches come from Settings """
+    url = URL.create(
+        "postgresql+asyncpg",
+        username=config.DB_USER,
+        password=config.DB_PASSWORD,
+        host=config.DB_HOST,
+        port=int(config.DB_PORT),
+        database=config.DB_NAME,
+        # SQLAlchemy's cache of asyncpg prepared statements, per connection
+        query={"prepared_statement_cache_size": str(config.DB_STATEMENT_CACHE_SIZE)},
+    )
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        connect_args={"statement_cache_size": config.DB_STATEMENT_CACHE_SIZE},  # asyncpg's own cache
+    )
+
+
+DB_TYPE = settings.DB_TYPE
 if DB_TYPE == "sqlite":
-    DATABASE_URL = "sqlite+aiosqlite:///./gunshot.db"
+    engine, read_engine = sqlite_engines()
+    export_engine = read_engine
+    if read_engine is not engine:
+        # An export holds its connection for the whole download; keep those out of the read pool
+        export_engine = sqlite_pooled_engine(settings.SQLITE_PATH, settings.EXPORT_MAX_CONCURRENT,
+                                             sqlite_pragmas())
 elif DB_TYPE == "postgres":
-    DB_USER = os.getenv("DB_USER", "postgres")
-    DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
-    DB_HOST = os.getenv("DB_HOST", "localhost")
-    DB_PORT = os.getenv("DB_PORT", "5432")
-    DB_NAME = os.getenv("DB_NAME", "gunshot")
-    DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    engine = read_engine = export_engine = postgres_engine()
+else:
+    raise ValueError(f"Unknown DB_TYPE: {DB_TYPE}")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
-AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+AsyncSessionLocal = session_factory(engine, read_engine)
+# Read-only sessions for /export/* streams
+ExportSessionLocal = sessionmaker(bind=export_engine, class_=AsyncSession, expire_on_commit=False)
 
 async def get_db():
     db = AsyncSessionLocal()
@@ -25,7 +118,110 @@ async def get_db():
     finally:
         await db.close()
 
+def insert_ignore_duplicates(model):
+    """ INSERT that skips rows violating a unique constraint (ON CONFLICT DO NOTHING) """
+    dialect = postgresql if DB_TYPE == "postgres" else sqlite
+    return dialect.insert(model).on_conflict_do_nothing()
+
+def upsert(model, index_elements, **values):
+    """ INSERT that overwrites the given columns when the row already exists """
+    dialect = postgresql if DB_TYPE == "postgres" else sqlite
+    stmt = dialect.insert(model).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in values if column not in index_elements},
+    )
+
+LOG_COPY_COLUMNS = ("timestamp", "lat", "lon", "mic_id")
+
+async def insert_logs(db, values):
+    """
+    Insert log dicts, skipping (mic_id, timestamp) duplicates, and return
+    (id, mic_id, timestamp) for the rows actually inserted.
+
+    On Postgres, batches of DB_COPY_MIN_ROWS or more are COPYed into a
+    temporary staging table and moved over with one INSERT ... SELECT ...
+    ON CONFLICT DO NOTHING, all inside the caller's transaction.
+    """
+    if not values:
+        return []
+    if DB_TYPE != "postgres" or len(values) < settings.DB_COPY_MIN_ROWS:
+        result = await db.execute(
+            insert_ignore_duplicates(LogEvent)
+            .values(values)
+            .returning(LogEvent.id, LogEvent.mic_id, LogEvent.timestamp)
+        )
+        return result.all()
+
+    # Writes go to the writer bind; the raw asyncpg connection shares its transaction
+    connection = await db.connection(bind_arguments={"clause": LogEvent.__table__.insert()})
+    raw = await connection.get_raw_connection()
+    await connection.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS log_events_staging "
+        "(timestamp BIGINT, lat DOUBLE PRECISION, lon DOUBLE PRECISION, mic_id INTEGER) "
+        "ON COMMIT DELETE ROWS"
+    ))
+    await raw.driver_connection.copy_records_to_table(
+        "log_events_staging",
+        records=[tuple(row[column] for column in LOG_COPY_COLUMNS) for row in values],
+        columns=LOG_COPY_COLUMNS,
+    )
+    result = await connection.execute(text(
+        "INSERT INTO log_events (timestamp, lat, lon, mic_id) "
+        "SELECT timestamp, lat, lon, mic_id FROM log_events_staging "
+        "ON CONFLICT (mic_id, timestamp) DO NOTHING "
+        "RETURNING id, mic_id, timestamp"
+    ))
+    rows = result.all()
+    # ON COMMIT DELETE ROWS empties it at commit; clear it now so a second batch in this transaction starts empty
+    await connection.execute(text("TRUNCATE log_events_staging"))
+    return rows
+
+async def dispose_engines():
+    for target in {engine, read_engine, export_engine}:
+        await target.dispose()
+
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+
+def upgrade_schema(conn):
+    """
+    Bring tables made by an older version of the schema up to date.
+    create_all only creates missing tables, never changes existing ones,
+    so this runs after it on every startup and does nothing once applied.
+    """
+    relax_legacy_logs_column(conn)
+    if not inspect(conn).has_index("log_events", "ix_log_events_mic_id_timestamp"):
+        drop_duplicate_logs(conn)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def relax_legacy_logs_column(conn):
+    """ gunshot_events.logs used to be NOT NULL; new events leave it empty """
+    columns = {column["name"]: column for column in inspect(conn).get_columns("gunshot_events")}
+    if columns["logs"]["nullable"]:
+        return
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE gunshot_events ALTER COLUMN logs DROP NOT NULL"))
+        return
+
+    # SQLite cannot alter a column, so copy the rows into a rebuilt table; upgrade_schema recreates the indexes
+    rebuilt = GunshotEvent.__table__.to_metadata(MetaData(), name="gunshot_events_rebuilt")
+    names = ", ".join(column.name for column in rebuilt.columns)
+    conn.execute(CreateTable(rebuilt))
+    conn.execute(text(f"INSERT INTO gunshot_events_rebuilt ({names}) SELECT {names} FROM gunshot_events"))
+    conn.execute(text("DROP TABLE gunshot_events"))
+    conn.execute(text("ALTER TABLE gunshot_events_rebuilt RENAME TO gunshot_events"))
+    print("Rebuilt gunshot_events with a nullable logs column")
 
+def drop_duplicate_logs(conn):
+    """ Keep the first log of each (mic_id, timestamp) so the unique index can be built """
+    result = conn.execute(text(
+        "DELETE FROM log_events WHERE timestamp IS NOT NULL AND id NOT IN "
+        "(SELECT MIN(id) FROM log_events WHERE timestamp IS NOT NULL GROUP BY mic_id, timestamp)"
+    ))
+    if result.rowcount:
+        print(f"Removed {result.rowcount} duplicate log events before adding the unique index")
@@ -1,125 +1,151 @@
-from fastapi import Query, Depends, HTTPException
 from app.models.gunshot_event import GunshotEvent
-from app.models.schemas.gunshot_event import GunshotEventSchema
-from app.utils.database import get_db
-from app.models.log_event import LogEvent
-from app.utils.estimate_gunshot_location import estimate_gunshot_location
+from app.models.gunshot_event_log import GunshotEventLog
+from app.utils.gunshot_logs import log_dict
+from app.utils.localization_executor import localization_executor
 from app.utils.websocket_manager import manager
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from collections import defaultdict
+from sqlalchemy import insert
+from collections import deque, OrderedDict
 import asyncio
 
+TIME_THRESHOLD = 1_000_000  # 1 seconds in microseconds
+CONSUMED_LOG_CACHE_SIZE = 100_000  # Log ids remembered in memory as already part of an event
 
+def group_logs(logs, time_threshold=TIME_THRESHOLD):
+    """
+    Sweep timestamp-sorted logs into groups of near-simultaneous detections.
 
-async def detect_gunshots(
-    start_time: int = Query(None), 
-    end_time: int = Query(None), 
-    db: AsyncSession = Depends(get_db)
-):
-    TIME_THRESHOLD = 1_000_000  # 1 seconds in microseconds 
-
-    # Fetch logs within the specified time range asynchronously
-    query = select(LogEvent).order_by(LogEvent.timestamp)
-    if start_time is not None:
-        query = query.where(LogEvent.timestamp >= start_time)
-    else:
-        query = query.where(LogEvent.timestamp >= int((datetime.now(timezone.utc).timestamp() - 5) * 1e6))
-    if end_time is not None:
-        query = query.where(LogEvent.timestamp <= end_time)
-    else:
-        query = query.where(LogEvent.timestamp <= int(datetime.now(timezone.utc).timestamp() * 1e6))
-
-    result = await db.execute(query)
-    logs = sorted(result.scalars().all(), key=lambda log: log.timestamp)
-    
-    print(f'len(logs) = {len(logs)}')
-
-    grouped_events = []
-    active_groups = []
+    A log joins the oldest open group whose min_time and max_time are both
+    within time_threshold and which has not heard from that mic yet. Since
+    logs are sorted, a group whose min_time falls more than time_threshold
+    behind the current log can never accept another one, so it is retired
+    from the front of the deque. Only groups still inside the window are
+    compared, which keeps the sweep close to O(logs) instead of O(logs x groups).
+    """
+    closed_groups = []
+    open_groups = deque()
 
     for log in logs:
-        added_to_group = False
-        merge_candidates = []
+        # Retire groups that fell out of the window (open_groups is ordered by min_time)
+        while open_groups and log.timestamp - open_groups[0]["min_time"] > time_threshold:
+            closed_groups.append(open_groups.popleft())
 
-        for group in active_groups:
-            #print(f"Checking log {log.id} against group with min_time={group['min_time']} max_time={group['max_time']} mics={group['mic_ids']}")
+        for group in open_groups:
             if (
-                abs(log.timestamp - group["min_time"]) <= TIME_THRESHOLD
-                and abs(log.timestamp - group["max_time"]) <= TIME_THRESHOLD
+                abs(log.timestamp - group["max_time"]) <= time_threshold
                 and log.mic_id not in group["mic_ids"]
             ):
-                #print(f"Log {log.id} added to an existing group")
-                merge_candidates.append(group)
-
-        if merge_candidates:
-            target_group = merge_candidates[0]  # Merge into the closest existing group
-            target_group["logs"].append(log)
-            target_group["min_time"] = min(target_group["min_time"], log.timestamp)
-            target_group["max_time"] = max(target_group["max_time"], log.timestamp)
-            target_group["mic_ids"].add(log.mic_id)
-            added_to_group = True
-
-        if not added_to_group:
-            #print(f"Creating a new group for log {log.id} (mic_id={log.mic_id}, timestamp={log.timestamp})")
-            active_groups.append({
+                group["logs"].append(log)
+                group["max_time"] = max(group["max_time"], log.timestamp)
+                group["mic_ids"].add(log.mic_id)
+                break
+        else:
+            open_groups.append({
                 "logs": [log],
                 "mic_ids": {log.mic_id},
                 "min_time": log.timestamp,
                 "max_time": log.timestamp
             })
 
-    #print(f"active_groups: {active_groups}")
+    closed_groups.extend(open_groups)
+    return closed_groups
+
+class ConsumedLogIndex:
+    """
+    Bounded, insertion-ordered set of LogEvent ids already used by an emitted
+    GunshotEvent. It short-circuits overlapping windows in memory; the
+    authoritative record is the gunshot_event_logs link table.
+    """
+
+    def __init__(self, max_size=CONSUMED_LOG_CACHE_SIZE):
+        self.max_size = max_size
+        self.ids = OrderedDict()
+
+    def __contains__(self, log_id):
+        return log_id in self.ids
 
-    # Filter groups with at least three unique mic_ids
-    grouped_events = [group["logs"] for group in active_groups if len(group["mic_ids"]) >= 3]
-    # print(f"grouped_events = {grouped_events}")
+    def add(self, log_ids):
+        for log_id in log_ids:
+            self.ids[log_id] = None
+            self.ids.move_to_end(log_id)
+        while len(self.ids) > self.max_size:
+            self.ids.popitem(last=False)
 
-    # Process gunshot event detection
+    def discard(self, log_ids):
+        for log_id in log_ids:
+            self.ids.pop(log_id, None)
+
+    def clear(self):
+        self.ids.clear()
+
+consumed_logs = ConsumedLogIndex()
+
+async def save_gunshot_events(grouped_events, db: AsyncSession):
+    """Locate, persist and broadcast one GunshotEvent per group of logs."""
     gunshot_events = []
     new_events = []
+    consumed_ids = []
 
+    candidate_groups = []
     for group in grouped_events:
-        if len(group) < 3:
-            continue
-
-        # Keep only the first occurrence of each mic_id
+        # Keep only the first occurrence of each mic_id, skipping logs another event already used
         # unique_logs = {log.mic_id: log for log in group}
         unique_logs = {}
         for log in group:
+            if log.id in consumed_logs:
+                continue
             if log.mic_id not in unique_logs:
                 unique_logs[log.mic_id] = log
 
+        if len(unique_logs) < 3:
+            continue
+
+        # Claim the logs before awaiting the solver so a concurrent window can't reuse them
         filtered_group = list(unique_logs.values())
+        consumed_logs.add([l.id for l in filtered_group])
+        candidate_groups.append(filtered_group)
 
-        event_location = estimate_gunshot_location(filtered_group)
-        if event_location:
-            new_event = GunshotEvent(
-                timestamp=event_location["time"],
-                lat=event_location["lat"],
-                lon=event_location["lon"],
-                logs=[{
-                    "id": l.id,
-                    "timestamp": l.timestamp,
-                    "lat": l.lat,
-                    "lon": l.lon,
-                    "mic_id": l.mic_id
-                } for l in filtered_group]
-            )
-            new_events.append(new_event)
-
-            gunshot_events.append({
-                "logs": new_event.logs,
-                "estimated_location": event_location
-            })
+    # Solve every group in the executor pool, off the event loop
+    locations = await localization_executor.solve_many(candidate_groups)
+
+    for filtered_group, event_location in zip(candidate_groups, locations):
+        log_ids = [l.id for l in filtered_group]
+
+        if isinstance(event_location, Exception) or not event_location:
+            if isinstance(event_location, Exception):
+                print(f"Error estimating gunshot location: {event_location}")
+            consumed_logs.discard(log_ids)
+            continue
+
+        consumed_ids.extend(log_ids)
+
+        new_event = GunshotEvent(
+            timestamp=event_location["time"],
+            lat=event_location["lat"],
+            lon=event_location["lon"],
+        )
+        new_events.append((new_event, log_ids))
 
-    # Bulk insert all events asynchronously
+        gunshot_events.append({
+            "logs": [log_dict(l) for l in filtered_group],
+            "estimated_location": event_location
+        })
+
+    # Bulk insert all events and link their logs in the same transaction
     try:
         if new_events:
-            db.add_all(new_events)
+            db.add_all([event for event, _ in new_events])
+            await db.flush()
+            await db.execute(insert(GunshotEventLog), [
+                {"gunshot_event_id": event.id, "log_event_id": log_id}
+                for event, log_ids in new_events
+                for log_id in log_ids
+            ])
             await db.commit()
     except Exception as e:
         await db.rollback()  # Roll back on failure
+        consumed_logs.discard(consumed_ids)
+        gunshot_events = []
         print(f"Error processing gunshot events: {e}")
     finally:
         await db.close()
@@ -127,8 +153,11 @@ async def detect_gunshots(
         # Send detected gunshot events via WebSocket asynchronously
         asyncio.create_task(broadcast_gunshot_event({"gunshot_events": gunshot_events}))
 
-    return {"gunshot_events": gunshot_events}
+    return gunshot_events
+
+def gunshot_location(gunshot_event: dict):
+    return gunshot_event["estimated_location"]["lat"], gunshot_event["estimated_location"]["lon"]
 
 async def broadcast_gunshot_event(event_data: dict):
-    """Send gunshot event to all connected WebSocket clients."""
-    await manager.broadcast(event_data)
\ No newline at end of file
+    """Send gunshot events to the WebSocket clients whose subscription covers them."""
+    await manager.publish(event_data, "gunshot_events", "gunshot", locate=gunshot_location)
\ No newline at end of file
@@ -1,22 +1,203 @@
+import warnings
 import numpy as np
 from scipy.optimize import minimize
 
-def estimate_gunshot_location(group):
+SPEED_OF_SOUND = 343.0  # meters per second
+METERS_PER_DEGREE = 111320  # Rough conversion for latitude (meters)
+CLOSED_FORM_TOLERANCE = 0.05  # RMS range residual (meters) below which the closed-form fix is final
+
+def to_local_frame(lats, lons, lat0, lon0):
+    """Project lat/lon arrays onto a local east/north plane in meters around (lat0, lon0)."""
+    east = (lons - lon0) * (METERS_PER_DEGREE * np.cos(np.radians(lat0)))
+    north = (lats - lat0) * METERS_PER_DEGREE
+    return east, north
+
+def from_local_frame(east, north, lat0, lon0):
+    """Inverse of to_local_frame."""
+    lat = lat0 + north / METERS_PER_DEGREE
+    lon = lon0 + east / (METERS_PER_DEGREE * np.cos(np.radians(lat0)))
+    return lat, lon
+
+def tdoa_residuals(params, east, north, times):
+    """Range residuals in meters: distance travelled by sound minus distance to each sensor."""
+    x, y, t = params
+    return SPEED_OF_SOUND * (times - t) - np.hypot(x - east, y - north)
+
+def tdoa_jacobian(params, east, north, times):
+    """Analytic Jacobian of tdoa_residuals with respect to (x, y, t)."""
+    x, y, t = params
+    distance = np.maximum(np.hypot(x - east, y - north), 1e-9)
+    jacobian = np.empty((len(east), 3))
+    jacobian[:, 0] = -(x - east) / distance
+    jacobian[:, 1] = -(y - north) / distance
+    jacobian[:, 2] = -SPEED_OF_SOUND
+    return jacobian
+
+def levenberg_marquardt(params, east, north, times, lower, upper, max_iter=100, tol=1e-10):
+    """
+    Bounded Levenberg-Marquardt on the TDOA residuals. Steps are projected back
+    into [lower, upper] and the damping follows the gain ratio (Nielsen), which
+    keeps large-residual fits from zig-zagging. Returns (params, cost, converged),
+    with cost the sum of squared residuals in square meters.
+    """
+    params = np.clip(params, lower, upper)
+    residuals = tdoa_residuals(params, east, north, times)
+    cost = residuals @ residuals
+    damping = 1e-3
+    growth = 2.0
+
+    for _ in range(max_iter):
+        jacobian = tdoa_jacobian(params, east, north, times)
+        jtj = jacobian.T @ jacobian
+        gradient = jacobian.T @ residuals
+
+        # Parameters pinned on a bound with the descent direction pointing outward stay fixed
+        free = ~(((params <= lower) & (gradient > 0)) | ((params >= upper) & (gradient < 0)))
+        if not free.any():
+            return params, cost, True
+        system = jtj + damping * np.diag(np.diag(jtj) + 1e-12)
+        step = np.zeros_like(params)
+        try:
+            if free.all():
+                step = np.linalg.solve(system, -gradient)
+            else:
+                step[free] = np.linalg.solve(system[np.ix_(free, free)], -gradient[free])
+        except np.linalg.LinAlgError:
+            return params, cost, False
+
+        candidate = np.clip(params + step, lower, upper)
+        step = candidate - params
+        candidate_residuals = tdoa_residuals(candidate, east, north, times)
+        candidate_cost = candidate_residuals @ candidate_residuals
+
+        if candidate_cost <= cost:
+            improvement = cost - candidate_cost
+            predicted = -(2 * gradient @ step + step @ jtj @ step)
+            gain = improvement / predicted if predicted > 0 else 1.0
+            moved = np.max(np.abs(step) / (np.abs(params) + 1.0))
+            params, residuals, cost = candidate, candidate_residuals, candidate_cost
+            damping = max(damping * max(1 / 3, 1 - (2 * gain - 1) ** 3), 1e-12)
+            growth = 2.0
+            if improvement <= tol * (1.0 + cost) or moved <= tol:
+                return params, cost, True
+        else:
+            damping *= growth
+            growth *= 2
+            if damping > 1e12:
+                # No downhill step left: we're sitting in a (possibly bounded) minimum
+                return params, cost, True
+
+    return params, cost, False
+
+def closed_form_tdoa(east, north, times):
+    """
+    Linearized closed-form TDOA solution (spherical interpolation, as in Chan's method).
+
+    Squaring |p - s_i| = c (t_i - t) and subtracting the equation of the first
+    sensor to hear the shot cancels the quadratic terms in p and t, leaving a
+    linear system in (x, y, t) solved by least squares. Needs at least four
+    sensors; returns None when the geometry is degenerate.
+    """
+    if len(east) < 4:
+        return None
+
+    ref = np.argmin(times)
+    others = np.arange(len(east)) != ref
+    c2 = SPEED_OF_SOUND ** 2
+
+    design = np.column_stack([
+        2 * (east[others] - east[ref]),
+        2 * (north[others] - north[ref]),
+        -2 * c2 * (times[others] - times[ref]),
+    ])
+    target = (
+        east[others] ** 2 + north[others] ** 2 - east[ref] ** 2 - north[ref] ** 2
+        - c2 * (times[others] ** 2 - times[ref] ** 2)
+    )
+
+    solution, _, rank, _ = np.linalg.lstsq(design, target, rcond=None)
+    if rank < 3 or not np.all(np.isfinite(solution)):
+        return None
+    return solution
+
+def emission_time_floor(diagonal, early_emission=True):
+    """
+    Lower bound on the emission time, in seconds after the first arrival.
+    The shot may precede the first arrival by the time sound needs to cross
+    the sensors' bounding box. early_emission=False keeps the Powell solver's
+    bound (no earlier than the first arrival), which reproduces its output
+    but biases the fix, since a real shot always predates its first arrival.
+    """
+    return -diagonal / SPEED_OF_SOUND if early_emission else np.zeros_like(diagonal)
+
+def estimate_gunshot_location(group, early_emission=True):
+    """
+    Multilaterate the source of a group of sensor logs.
+
+    Sensors are projected once into a local meter frame and the TDOA residuals
+    are minimised with Levenberg-Marquardt on NumPy arrays using an analytic
+    Jacobian, seeded by the closed-form TDOA solution when there are four or
+    more sensors. The source is bounded to the sensors' bounding box, and its
+    emission time to at most the last arrival and no earlier than
+    emission_time_floor allows.
+    """
     if len(group) < 3:
         raise ValueError("At least three sensor logs are required to estimate the gunshot location.")
 
-    SPEED_OF_SOUND = 343.0  # meters per second
+    lats = np.array([log.lat for log in group], dtype=float)
+    lons = np.array([log.lon for log in group], dtype=float)
+    timestamps = np.array([log.timestamp for log in group], dtype=np.int64)
+
+    # Normalize timestamps to seconds relative to the earliest log
+    t0 = int(timestamps.min())
+    times = (timestamps - t0) / 1e6
+
+    lat0, lon0 = lats.mean(), lons.mean()
+    east, north = to_local_frame(lats, lons, lat0, lon0)
+
+    diagonal = np.hypot(np.ptp(east), np.ptp(north))
+    lower = np.array([east.min(), north.min(), emission_time_floor(diagonal, early_emission)])
+    upper = np.array([east.max(), north.max(), times.max()])
+    # Seed with the closed-form solution when the group is large enough, else the median sensor
+    closed_form = closed_form_tdoa(east, north, times)
+    if closed_form is not None:
+        initial_guess = np.clip(closed_form, lower, upper)
+    else:
+        initial_guess = np.array([np.median(east), np.median(north), 0.0])
+
+    residuals = tdoa_residuals(initial_guess, east, north, times)
+    if closed_form is not None and np.sqrt(np.mean(residuals ** 2)) <= CLOSED_FORM_TOLERANCE:
+        params = initial_guess  # Already fits the arrivals; skip the iterative solve
+    else:
+        params, cost, converged = levenberg_marquardt(initial_guess, east, north, times, lower, upper)
+        if not converged:
+            raise RuntimeError("Optimization failed to converge.")
+
+    x, y, estimated_time = params
+    # Floor the offset (it can be negative) the same way estimate_gunshot_locations does
+    event_time = t0 + int(np.floor(estimated_time * 1e6))
+    estimated_lat, estimated_lon = from_local_frame(x, y, lat0, lon0)
+    estimated_lat, estimated_lon = float(estimated_lat), float(estimated_lon)
+
+    print(f"Estimated location: lat={estimated_lat}, lon={estimated_lon}, time={event_time}")
+
+    return {"lat": estimated_lat, "lon": estimated_lon, "time": event_time}  # Back in microseconds
+
+def estimate_gunshot_location_powell(group):
+    """Original Powell-based solver, kept for comparison with estimate_gunshot_location."""
+    if len(group) < 3:
+        raise ValueError("At least three sensor logs are required to estimate the gunshot location.")
 
     def latlon_to_meters(lat1, lon1, lat2, lon2):
         """Convert lat/lon differences to meters using Haversine approximation."""
-        lat_diff = (lat2 - lat1) * 111320  # Rough conversion for latitude (meters)
-        lon_diff = (lon2 - lon1) * (111320 * np.cos(np.radians(lat1)))  # Adjusted for longitude
+        lat_diff = (lat2 - lat1) * METERS_PER_DEGREE
+        lon_diff = (lon2 - lon1) * (METERS_PER_DEGREE * np.cos(np.radians(lat1)))  # Adjusted for longitude
         return np.sqrt(lat_diff**2 + lon_diff**2)
 
     # Normalize timestamps to seconds relative to the earliest log
     t0 = min(log.timestamp for log in group) / 1e6  # Convert to seconds
     normalized_logs = [
-        {"lat": log.lat, "lon": log.lon, "timestamp": log.timestamp / 1e6 - t0} 
+        {"lat": log.lat, "lon": log.lon, "timestamp": log.timestamp / 1e6 - t0}
         for log in group
     ]
 
@@ -51,6 +232,185 @@ def estimate_gunshot_location(group):
 
     estimated_lat, estimated_lon, estimated_time = result.x
 
-    print(f"Estimated location: lat={estimated_lat}, lon={estimated_lon}, time={int((estimated_time + t0) * 1e6)}")
-
     return {"lat": estimated_lat, "lon": estimated_lon, "time": int((estimated_time + t0) * 1e6)}  # Convert back to microseconds
+
+def estimate_gunshot_locations(groups, max_iter=100, tol=1e-10, early_emission=True):
+    """
+    Batch counterpart of estimate_gunshot_location for replays and busy windows.
+
+    Every group is packed into padded (groups x sensors) NumPy arrays with a
+    mask for the real sensors, seeded with a batched closed-form solution and
+    refined with a Levenberg-Marquardt iteration that updates all groups at
+    once. Returns one dict per group with lat/lon/time and a "converged" flag;
+    groups with fewer than three logs come back unsolved.
+    """
+    if not groups:
+        return []
+
+    n_groups = len(groups)
+    width = max(len(group) for group in groups)
+    if width == 0:
+        return [{"lat": None, "lon": None, "time": None, "converged": False} for _ in groups]
+    lats = np.zeros((n_groups, width))
+    lons = np.zeros((n_groups, width))
+    timestamps = np.zeros((n_groups, width), dtype=np.int64)
+    mask = np.zeros((n_groups, width), dtype=bool)
+    for g, group in enumerate(groups):
+        for n, log in enumerate(group):
+            lats[g, n], lons[g, n], timestamps[g, n] = log.lat, log.lon, log.timestamp
+        mask[g, :len(group)] = True
+
+    counts = mask.sum(axis=1)
+    solvable = counts >= 3
+    safe_counts = np.maximum(counts, 1)
+
+    # Normalize timestamps to seconds relative to each group's earliest log
+    t0 = np.where(mask, timestamps, np.iinfo(np.int64).max).min(axis=1)
+    t0 = np.where(counts > 0, t0, 0)
+    times = np.where(mask, (timestamps - t0[:, None]) / 1e6, 0.0)
+
+    lat0 = (lats * mask).sum(axis=1) / safe_counts
+    lon0 = (lons * mask).sum(axis=1) / safe_counts
+    east, north = to_local_frame(lats, lons, lat0[:, None], lon0[:, None])
+    east, north = np.where(mask, east, 0.0), np.where(mask, north, 0.0)
+
+    def masked_extreme(values, reducer, fill):
+        return np.where(counts > 0, reducer(np.where(mask, values, fill), axis=1), 0.0)
+
+    east_min, east_max = masked_extreme(east, np.min, np.inf), masked_extreme(east, np.max, -np.inf)
+    north_min, north_max = masked_extreme(north, np.min, np.inf), masked_extreme(north, np.max, -np.inf)
+    diagonal = np.hypot(east_max - east_min, north_max - north_min)
+    lower = np.column_stack([east_min, north_min, emission_time_floor(diagonal, early_emission)])
+    upper = np.column_stack([east_max, north_max, masked_extreme(times, np.max, -np.inf)])
+
+    # Seed: batched closed-form TDOA where possible, median sensor otherwise
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # Empty groups have an all-NaN median
+        median_guess = np.column_stack([
+            np.nanmedian(np.where(mask, east, np.nan), axis=1),
+            np.nanmedian(np.where(mask, north, np.nan), axis=1),
+            np.zeros(n_groups),
+        ])
+    median_guess = np.nan_to_num(median_guess)
+    closed_form, closed_form_ok = batched_closed_form_tdoa(east, north, times, mask)
+    params = np.where(closed_form_ok[:, None], closed_form, median_guess)
+    params = np.clip(params, lower, upper)
+
+    def residuals_of(p):
+        distance = np.hypot(p[:, 0:1] - east, p[:, 1:2] - north)
+        return np.where(mask, SPEED_OF_SOUND * (times - p[:, 2:3]) - distance, 0.0)
+
+    residuals = residuals_of(params)
+    cost = (residuals ** 2).sum(axis=1)
+    rms = np.sqrt(cost / safe_counts)
+
+    converged = solvable & closed_form_ok & (rms <= CLOSED_FORM_TOLERANCE)
+    active = solvable & ~converged
+    damping = np.full(n_groups, 1e-3)
+    growth = np.full(n_groups, 2.0)
+    identity = np.eye(3)
+
+    for _ in range(max_iter):
+        if not active.any():
+            break
+
+        distance = np.maximum(np.hypot(params[:, 0:1] - east, params[:, 1:2] - north), 1e-9)
+        jacobian = np.stack([
+            -(params[:, 0:1] - east) / distance,
+            -(params[:, 1:2] - north) / distance,
+            np.full_like(distance, -SPEED_OF_SOUND),
+        ], axis=2) * mask[:, :, None]
+        jtj = np.einsum("gni,gnj->gij", jacobian, jacobian)
+        gradient = np.einsum("gni,gn->gi", jacobian, residuals)
+
+        # Pin parameters on a bound whose descent direction points outward
+        pinned = ((params <= lower) & (gradient > 0)) | ((params >= upper) & (gradient < 0))
+        stuck = active & pinned.all(axis=1)
+        converged |= stuck
+        active &= ~stuck
+
+        free = ~pinned & active[:, None]
+        free_pairs = free[:, :, None] & free[:, None, :]
+        diagonal_terms = np.einsum("gii->gi", jtj) + 1e-12
+        system = np.where(free_pairs, jtj + damping[:, None, None] * diagonal_terms[:, :, None] * identity, 0.0)
+        system += identity * ~free[:, :, None]
+        rhs = np.where(free, -gradient, 0.0)
+        step = np.linalg.solve(system, rhs[:, :, None])[:, :, 0]
+
+        candidate = np.clip(params + step, lower, upper)
+        step = candidate - params
+        candidate_residuals = residuals_of(candidate)
+        candidate_cost = (candidate_residuals ** 2).sum(axis=1)
+
+        accept = active & (candidate_cost <= cost)
+        reject = active & ~accept
+
+        improvement = cost - candidate_cost
+        predicted = -(2 * np.einsum("gi,gi->g", gradient, step) + np.einsum("gi,gij,gj->g", step, jtj, step))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gain = np.where(predicted > 0, improvement / predicted, 1.0)
+        moved = np.max(np.abs(step) / (np.abs(params) + 1.0), axis=1)
+        done = accept & ((improvement <= tol * (1.0 + candidate_cost)) | (moved <= tol))
+
+        params = np.where(accept[:, None], candidate, params)
+        residuals = np.where(accept[:, None], candidate_residuals, residuals)
+        cost = np.where(accept, candidate_cost, cost)
+        # Same gain-ratio damping as levenberg_marquardt
+        shrink = np.maximum(1 / 3, 1 - (2 * gain - 1) ** 3)
+        damping = np.where(accept, np.maximum(damping * shrink, 1e-12), damping)
+        damping = np.where(reject, damping * growth, damping)
+        growth = np.where(accept, 2.0, np.where(reject, growth * 2, growth))
+
+        # No downhill step left: we're sitting in a (possibly bounded) minimum
+        exhausted = reject & (damping > 1e12)
+        converged |= done | exhausted
+        active &= ~(done | exhausted)
+
+    estimated_lat, estimated_lon = from_local_frame(params[:, 0], params[:, 1], lat0, lon0)
+    estimated_time = t0 + np.floor(params[:, 2] * 1e6).astype(np.int64)
+
+    return [
+        {
+            "lat": float(estimated_lat[g]) if solvable[g] else None,
+            "lon": float(estimated_lon[g]) if solvable[g] else None,
+            "time": int(estimated_time[g]) if solvable[g] else None,
+            "converged": bool(converged[g]),
+        }
+        for g in range(n_groups)
+    ]
+
+def batched_closed_form_tdoa(east, north, times, mask):
+    """
+    closed_form_tdoa over padded (groups x sensors) arrays. Returns the
+    solutions and a flag per group telling whether the system was usable
+    (four or more sensors, full rank).
+    """
+    n_groups, width = east.shape
+    c2 = SPEED_OF_SOUND ** 2
+    ref = np.argmin(np.where(mask, times, np.inf), axis=1)
+    rows = np.arange(n_groups)
+
+    ref_east, ref_north, ref_time = east[rows, ref][:, None], north[rows, ref][:, None], times[rows, ref][:, None]
+    use = mask & (np.arange(width)[None, :] != ref[:, None])
+
+    design = np.stack([
+        2 * (east - ref_east),
+        2 * (north - ref_north),
+        -2 * c2 * (times - ref_time),
+    ], axis=2) * use[:, :, None]
+    target = (
+        east ** 2 + north ** 2 - ref_east ** 2 - ref_north ** 2 - c2 * (times ** 2 - ref_time ** 2)
+    ) * use
+
+    normal = np.einsum("gni,gnj->gij", design, design)
+    rhs = np.einsum("gni,gn->gi", design, target)
+
+    # Column scaling keeps the metre and second columns comparable before the rank check
+    scale = np.sqrt(np.maximum(np.einsum("gii->gi", normal), 1e-300))
+    scaled = normal / (scale[:, :, None] * scale[:, None, :])
+    ok = (mask.sum(axis=1) >= 4) & (np.linalg.matrix_rank(scaled) == 3)
+
+    scaled = np.where(ok[:, None, None], scaled, np.eye(3))
+    solution = np.linalg.solve(scaled, (rhs / scale)[:, :, None])[:, :, 0] / scale
+    ok &= np.all(np.isfinite(solution), axis=1)
+    return np.where(ok[:, None], solution, 0.0), ok
@@ -0,0 +1,47 @@
+from collections import defaultdict
+from sqlalchemy import select, exists
+from app.models.gunshot_event_log import GunshotEventLog
+from app.models.log_event import LogEvent
+
+def is_unconsumed():
+    """ WHERE clause for logs that no gunshot event has been located from yet """
+    return ~exists().where(GunshotEventLog.log_event_id == LogEvent.id)
+
+def log_dict(log):
+    return {"id": log.id, "timestamp": log.timestamp, "lat": log.lat, "lon": log.lon, "mic_id": log.mic_id}
+
+async def event_logs(db, event_ids):
+    """ {gunshot_event_id: [log dicts]} read through the link table, in the old `logs` shape """
+    logs = defaultdict(list)
+    if not event_ids:
+        return logs
+    result = await db.execute(
+        select(GunshotEventLog.gunshot_event_id, LogEvent.id, LogEvent.timestamp,
+               LogEvent.lat, LogEvent.lon, LogEvent.mic_id)
+        .join(LogEvent, LogEvent.id == GunshotEventLog.log_event_id)
+        .where(GunshotEventLog.gunshot_event_id.in_(event_ids))
+        .order_by(GunshotEventLog.gunshot_event_id, LogEvent.timestamp)
+    )
+    for row in result.all():
+        logs[row.gunshot_event_id].append(log_dict(row))
+    return logs
+
+async def attach_logs(db, events):
+    """
+    Fill in events[i]["logs"] for API responses. Events written before the
+    link table existed keep the JSON copy stored on the row; it stays the
+    record even once the archiver has linked whichever of those logs remain.
+    """
+    linked = await event_logs(db, [event["id"] for event in events])
+    for event in events:
+        if not event.get("logs"):
+            event["logs"] = linked.get(event["id"], [])
+    return events
+
+def events_with_mic(mic_id):
+    """ Subquery of gunshot event ids a mic contributed to (index lookups on both tables) """
+    return (
+        select(GunshotEventLog.gunshot_event_id)
+        .join(LogEvent, LogEvent.id == GunshotEventLog.log_event_id)
+        .where(LogEvent.mic_id == mic_id)
+    )
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from app.core.config import settings
+from app.utils.database import AsyncSessionLocal, insert_logs
+
+class IngestBuffer:
+    """
+    Write-behind buffer with group commit for incoming logs.
+
+    Requests enqueue validated logs together with a future and wait on it. A
+    single writer task drains the queue and inserts everything that arrived
+    within flush_interval_ms (or up to max_batch_rows rows) in one
+    transaction. Futures resolve only after that commit, so a request still
+    returns only once its log is durable.
+    """
+
+    def __init__(self, flush_interval_ms=settings.INGEST_FLUSH_INTERVAL_MS,
+                 max_batch_rows=settings.INGEST_MAX_BATCH_ROWS, max_queue=settings.INGEST_MAX_QUEUE):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.max_queue = max_queue
+        self.queue = None
+        self.writer_task = None
+
+        self.rows_received = 0
+        self.rows_committed = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.last_batch_rows = 0
+        self.max_batch_seen = 0
+        self.total_flush_time = 0.0
+        self.max_flush_time = 0.0
+
+    def start(self):
+        if self.writer_task is None or self.writer_task.done():
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self.writer_task = asyncio.create_task(self.run())
+
+    async def submit(self, events):
+        """Queue LogEventCreate objects; returns their ids (None for duplicates) once committed."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((events, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            rows = len(item[0])
+            deadline = loop.time() + self.flush_interval
+
+            # Keep collecting until the latency bound or the size bound is hit
+            while rows < self.max_batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True  # close() was called: flush this batch, then exit
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            await self.flush(batch)
+
+    async def flush(self, batch):
+        started = time.perf_counter()
+        values = [event.dict() for events, _ in batch for event in events]
+
+        try:
+            async with AsyncSessionLocal() as db:
+                inserted = await insert_logs(db, values)
+                inserted_ids = {(mic_id, timestamp): log_id for log_id, mic_id, timestamp in inserted}
+                await db.commit()
+        except Exception as e:
+            self.failed_batches += 1
+            print(f"Error flushing ingest batch: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # The same (mic_id, timestamp) may be queued twice; only the first one owns the row
+        for events, future in batch:
+            ids = []
+            for event in events:
+                ids.append(inserted_ids.pop((event.mic_id, event.timestamp), None))
+            self.duplicates += ids.count(None)
+            self.rows_committed += len(ids) - ids.count(None)
+            if not future.done():
+                future.set_result(ids)
+
+        elapsed = time.perf_counter() - started
+        self.batches += 1
+        self.rows_received += len(values)
+        self.last_batch_rows = len(values)
+        self.max_batch_seen = max(self.max_batch_seen, len(values))
+        self.total_flush_time += elapsed
+        self.max_flush_time = max(self.max_flush_time, elapsed)
+
+    async def close(self):
+        """Flush whatever is queued and stop the writer."""
+        if self.writer_task is None or self.writer_task.done():
+            return
+        await self.queue.put(None)
+        await self.writer_task
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "rows_committed": self.rows_committed,
+            "duplicates": self.duplicates,
+            "last_batch_rows": self.last_batch_rows,
+            "max_batch_rows": self.max_batch_seen,
+            "avg_batch_rows": self.rows_received / self.batches if self.batches else None,
+            "avg_flush_ms": 1e3 * self.total_flush_time / self.batches if self.batches else None,
+            "max_flush_ms": 1e3 * self.max_flush_time,
+        }
+
+ingest_buffer = IngestBuffer()
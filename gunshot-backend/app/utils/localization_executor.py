@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from app.core.config import settings
+from app.utils.estimate_gunshot_location import estimate_gunshot_location, estimate_gunshot_locations
+
+# Plain, picklable copy of the LogEvent fields the solver reads
+SensorLog = namedtuple("SensorLog", ["lat", "lon", "timestamp", "mic_id"])
+
+BATCH_SOLVE_THRESHOLD = 8  # Groups per window above which one vectorized batch solve is used
+
+def timed_estimate(group):
+    """Run the solver in a worker and report how long the solve itself took."""
+    started = time.perf_counter()
+    location = estimate_gunshot_location(group, early_emission=settings.LOCALIZATION_EARLY_EMISSION)
+    return location, time.perf_counter() - started
+
+def timed_estimate_batch(groups):
+    """Batch variant of timed_estimate built on estimate_gunshot_locations."""
+    started = time.perf_counter()
+    locations = estimate_gunshot_locations(groups, early_emission=settings.LOCALIZATION_EARLY_EMISSION)
+    return locations, time.perf_counter() - started
+
+class LocalizationExecutor:
+    """
+    Solves gunshot locations in a process (or thread) pool so the CPU-bound
+    optimizer never stalls the event loop. Keeps simple counters for
+    queue depth and solve time.
+    """
+
+    def __init__(self, kind=settings.LOCALIZATION_EXECUTOR, workers=settings.LOCALIZATION_WORKERS):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown localization executor: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.pool = None
+        self.pending = 0
+        self.solved = 0
+        self.failed = 0
+        self.batches = 0
+        self.total_solve_time = 0.0
+        self.max_solve_time = 0.0
+        self.total_wait_time = 0.0
+
+    def get_pool(self):
+        if self.pool is None:
+            pool_class = ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+            self.pool = pool_class(max_workers=self.workers)
+        return self.pool
+
+    async def solve(self, group):
+        """Estimate the location of one group of logs in the pool."""
+        points = [SensorLog(log.lat, log.lon, log.timestamp, log.mic_id) for log in group]
+        loop = asyncio.get_running_loop()
+
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            location, solve_time = await loop.run_in_executor(self.get_pool(), timed_estimate, points)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.solved += 1
+        self.total_solve_time += solve_time
+        self.max_solve_time = max(self.max_solve_time, solve_time)
+        self.total_wait_time += max(0.0, time.perf_counter() - submitted - solve_time)
+        return location
+
+    async def solve_batch(self, groups):
+        """Solve many groups in a single vectorized job; failed groups come back as exceptions."""
+        batch = [[SensorLog(log.lat, log.lon, log.timestamp, log.mic_id) for log in group] for group in groups]
+        loop = asyncio.get_running_loop()
+
+        self.pending += len(batch)
+        submitted = time.perf_counter()
+        try:
+            locations, solve_time = await loop.run_in_executor(self.get_pool(), timed_estimate_batch, batch)
+        except Exception:
+            self.failed += len(batch)
+            raise
+        finally:
+            self.pending -= len(batch)
+
+        results = []
+        for location in locations:
+            if location["converged"]:
+                self.solved += 1
+                results.append({"lat": location["lat"], "lon": location["lon"], "time": location["time"]})
+            else:
+                self.failed += 1
+                results.append(RuntimeError("Optimization failed to converge."))
+
+        self.batches += 1
+        self.total_solve_time += solve_time
+        self.max_solve_time = max(self.max_solve_time, solve_time)
+        self.total_wait_time += max(0.0, time.perf_counter() - submitted - solve_time)
+        return results
+
+    async def solve_many(self, groups):
+        """Solve groups concurrently; failed groups come back as exceptions."""
+        if len(groups) >= BATCH_SOLVE_THRESHOLD:
+            try:
+                return await self.solve_batch(groups)
+            except Exception as e:
+                return [e] * len(groups)
+        return await asyncio.gather(*(self.solve(group) for group in groups), return_exceptions=True)
+
+    def stats(self):
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "queue_depth": self.pending,
+            "solved": self.solved,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_solve_ms": 1e3 * self.total_solve_time / self.solved if self.solved else None,
+            "max_solve_ms": 1e3 * self.max_solve_time,
+            "avg_wait_ms": 1e3 * self.total_wait_time / self.solved if self.solved else None,
+        }
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+localization_executor = LocalizationExecutor()
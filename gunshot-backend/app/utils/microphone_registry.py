@@ -0,0 +1,63 @@
+import math
+from geopy.distance import geodesic
+from sqlalchemy import select
+from app.models.microphone import Microphone
+
+MOVE_THRESHOLD_METERS = 10  # A mic further than this from its known position has moved
+GEODESIC_MARGIN_METERS = 0.5  # Band around the threshold where the cheap estimate isn't trusted
+EARTH_RADIUS_METERS = 6_371_008.8
+
+def equirectangular_distance(lat1, lon1, lat2, lon2):
+    """Flat-earth distance in meters; accurate to well under 1% at sensor-move scales."""
+    mean_lat = math.radians((lat1 + lat2) / 2)
+    dx = math.radians(lon2 - lon1) * math.cos(mean_lat)
+    dy = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_METERS * math.hypot(dx, dy)
+
+def moved_beyond_threshold(old_location, new_location):
+    """Cheap equirectangular check, falling back to geodesic only near MOVE_THRESHOLD_METERS."""
+    distance = equirectangular_distance(*old_location, *new_location)
+    if abs(distance - MOVE_THRESHOLD_METERS) <= GEODESIC_MARGIN_METERS:
+        distance = geodesic(old_location, new_location).meters
+    return distance > MOVE_THRESHOLD_METERS
+
+class MicrophoneRegistry:
+    """
+    Process-wide, in-memory copy of the microphones table. Loaded at startup
+    and updated after every committed write, so deciding whether a log moves
+    its mic never needs a SELECT.
+    """
+
+    def __init__(self):
+        self.mics = {}  # mic_id -> (lat, lon)
+        self.version = 0  # Bumped once per published sensor message; clients use it to spot missed deltas
+
+    async def load(self, db):
+        result = await db.execute(select(Microphone.mic_id, Microphone.lat, Microphone.lon))
+        self.mics = {mic_id: (lat, lon) for mic_id, lat, lon in result.all()}
+        self.version += 1
+
+    def has_moved(self, mic_id, lat, lon):
+        """True if the mic is unknown or further than MOVE_THRESHOLD_METERS from its known position."""
+        known = self.mics.get(mic_id)
+        if known is None:
+            return True
+        return moved_beyond_threshold(known, (lat, lon))
+
+    def update(self, mic_id, lat, lon):
+        self.mics[mic_id] = (lat, lon)
+
+    def update_many(self, changes):
+        self.mics.update(changes)
+
+    def clear(self):
+        self.mics.clear()
+
+    def bump_version(self):
+        self.version += 1
+        return self.version
+
+    def snapshot(self):
+        return [{"mic_id": mic_id, "lat": lat, "lon": lon} for mic_id, (lat, lon) in self.mics.items()]
+
+microphone_registry = MicrophoneRegistry()
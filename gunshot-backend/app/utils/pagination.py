@@ -0,0 +1,31 @@
+import base64
+from sqlalchemy import and_, or_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(*values: int) -> str:
+    """ Opaque cursor for the (timestamp, id) key of the last row on a page """
+    raw = ":".join(str(value) for value in values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int = 2) -> tuple:
+    """ Inverse of encode_cursor; raises ValueError for anything it did not produce """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        values = tuple(int(value) for value in raw.split(":"))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Malformed cursor")
+    if len(values) != size:
+        raise ValueError("Malformed cursor")
+    return values
+
+def after_key(timestamp_column, id_column, cursor_key, descending=False):
+    """
+    Keyset condition for rows strictly after (timestamp, id) in the page order.
+    Spelled out with OR/AND rather than a row-value comparison so SQLite and
+    Postgres both use the timestamp index.
+    """
+    timestamp, row_id = cursor_key
+    if descending:
+        return or_(timestamp_column < timestamp, and_(timestamp_column == timestamp, id_column < row_id))
+    return or_(timestamp_column > timestamp, and_(timestamp_column == timestamp, id_column > row_id))
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from sqlalchemy import select, delete, func, text, tuple_
+from app.models.gunshot_event import GunshotEvent
+from app.models.gunshot_event_log import GunshotEventLog
+from app.models.log_event import LogEvent
+from app.models.microphone import Microphone
+from app.utils.database import AsyncSessionLocal, engine, DB_TYPE
+from app.utils.detect_gunshots import consumed_logs
+from app.utils.microphone_registry import microphone_registry
+from app.utils.sensor_updates import broadcast_sensor_snapshot, sensor_scheduler
+from app.utils.stream_detector import stream_detector
+
+PURGE_CHUNK_ROWS = 5000  # Rows per DELETE transaction; small enough that ingest barely notices
+
+# Delete order respects references: links first, then what they point at.
+# Microphones come last and are not matched by key range (see delete_microphones)
+PURGE_TABLES = (
+    ("gunshot_event_logs", GunshotEventLog.gunshot_event_id),
+    ("log_events", LogEvent.id),
+    ("gunshot_events", GunshotEvent.id),
+    ("microphones", Microphone.mic_id),
+)
+
+
+class PurgeJob:
+    """
+    Background replacement for the single-transaction purge behind /delete_events.
+
+    The chunked mode deletes every row that existed when the job started,
+    walking each table by key in ranges of PURGE_CHUNK_ROWS, one short
+    transaction per range, and yields between them so /log_event keeps
+    flowing. Rows written while it runs are left alone, including
+    microphones added or moved in the meantime. The fast mode empties
+    the tables in one go (TRUNCATE on Postgres, an unqualified DELETE, which
+    SQLite truncates without per-row work) and is meant for when nothing else
+    is writing. Neither mode resets id counters, since archived rows keep theirs.
+    """
+
+    def __init__(self, chunk_rows=PURGE_CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+        self.task = None
+        self.state = {"status": "idle"}
+
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self, fast=False):
+        self.state = {
+            "status": "running",
+            "mode": "fast" if fast else "chunked",
+            "started_at": time.time(),
+            "finished_at": None,
+            "deleted": {name: 0 for name, _ in PURGE_TABLES},
+            "error": None,
+        }
+        self.task = asyncio.create_task(self.run(fast))
+        return self.status()
+
+    def status(self):
+        return dict(self.state)
+
+    async def run(self, fast):
+        try:
+            if fast:
+                await self.truncate()
+            else:
+                await self.delete_chunked()
+            await self.reset_memory()
+            self.state["status"] = "done"
+        except Exception as e:
+            print(f"Error clearing gunshot events & microphones: {e}")
+            self.state["status"] = "failed"
+            self.state["error"] = str(e)
+        finally:
+            self.state["finished_at"] = time.time()
+
+    async def delete_chunked(self):
+        # Fix the upper bound of every table first so the job always terminates
+        async with AsyncSessionLocal() as db:
+            upper = {name: await db.scalar(select(func.max(key))) for name, key in PURGE_TABLES}
+            positions = (await db.execute(select(Microphone.mic_id, Microphone.lat, Microphone.lon))).all()
+
+        # Open detector groups must not emit events for logs that are about to disappear
+        if upper["log_events"] is not None:
+            stream_detector.discard_logs(upper["log_events"])
+
+        for name, key in PURGE_TABLES:
+            if name == "microphones":
+                await self.delete_microphones(positions)
+                continue
+            if upper[name] is None:
+                continue
+            last = None
+            while True:
+                async with AsyncSessionLocal() as db:
+                    query = select(key).where(key <= upper[name]).order_by(key).limit(self.chunk_rows)
+                    if last is not None:
+                        query = query.where(key > last)
+                    keys = (await db.execute(query)).scalars().all()
+                    if not keys:
+                        break
+                    result = await db.execute(delete(key.table).where(key >= keys[0], key <= keys[-1]))
+                    await db.commit()
+                last = keys[-1]
+                self.state["deleted"][name] += result.rowcount
+                await asyncio.sleep(0)  # Give queued writes the lock between chunks
+
+    async def delete_microphones(self, positions):
+        """
+        Mic ids are chosen by the sensors rather than handed out in order, so
+        a key range can't tell which rows existed at the start. Only rows still
+        holding the position they had then are deleted; a mic added or moved
+        while the job ran keeps its row.
+        """
+        for offset in range(0, len(positions), self.chunk_rows):
+            chunk = [tuple(row) for row in positions[offset:offset + self.chunk_rows]]
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    delete(Microphone).where(tuple_(Microphone.mic_id, Microphone.lat, Microphone.lon).in_(chunk))
+                )
+                await db.commit()
+            self.state["deleted"]["microphones"] += result.rowcount
+            await asyncio.sleep(0)
+
+    async def truncate(self):
+        stream_detector.open_groups.clear()
+        if DB_TYPE == "postgres":
+            async with engine.begin() as conn:
+                # Keeps log_events' partitions and the id sequences
+                await conn.execute(text("TRUNCATE gunshot_event_logs, log_events, gunshot_events, microphones"))
+            return
+        async with engine.begin() as conn:
+            # No WHERE clause lets SQLite drop the table's pages wholesale instead of row by row
+            for name, _ in PURGE_TABLES:
+                await conn.execute(text(f"DELETE FROM {name}"))
+
+    async def reset_memory(self):
+        consumed_logs.clear()
+        sensor_scheduler.discard_pending()
+        # Reload rather than clear: microphones may have been added while the job ran
+        async with AsyncSessionLocal() as db:
+            await microphone_registry.load(db)
+        await broadcast_sensor_snapshot()  # Clients replace whatever sensors they were showing
+
+
+purge_job = PurgeJob()
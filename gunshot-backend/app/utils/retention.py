@@ -0,0 +1,194 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import select, delete, text
+from app.core.config import settings
+from app.models.log_event import LogEvent, LOG_EVENTS_PARTITIONED
+from app.models.gunshot_event_log import GunshotEventLog
+from app.utils.database import AsyncSessionLocal, engine
+from app.utils.archive import archiver
+
+DAY_MICROSECONDS = 86_400_000_000
+EPOCH = date(1970, 1, 1)
+
+
+def day_start(day: date) -> int:
+    """ First microsecond timestamp of a UTC day """
+    return (day - EPOCH).days * DAY_MICROSECONDS
+
+
+def partition_name(day: date) -> str:
+    return f"log_events_p{day:%Y%m%d}"
+
+
+def partition_day(name: str):
+    """ Inverse of partition_name; None for the default partition or anything else """
+    try:
+        return datetime.strptime(name, "log_events_p%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+class RetentionJob:
+    """
+    Keeps log_events bounded in the background.
+
+    On a partitioned Postgres table it creates the daily partitions a few days
+    ahead (rows outside them land in log_events_default) and drops whole
+    partitions once they are older than LOG_RETENTION_DAYS, which costs the
+    same however many rows they hold. Elsewhere (SQLite, or a Postgres table
+    created before partitioning) it deletes expired rows in small batches
+    through the timestamp index, so the writer is never held for long.
+    Links to gunshot events are removed together with their logs.
+
+    When archiving is enabled, days past ARCHIVE_AFTER_DAYS are first moved
+    to the archive, so retention only deletes what is older still.
+    """
+
+    def __init__(self, retention_days=settings.LOG_RETENTION_DAYS, interval=settings.LOG_RETENTION_INTERVAL_S,
+                 batch_rows=settings.LOG_RETENTION_BATCH_ROWS, premake_days=settings.LOG_PARTITION_PREMAKE_DAYS):
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_rows = batch_rows
+        self.premake_days = premake_days
+        self.partitioned = False  # Set by prepare() once the live table has been checked
+        self.task = None
+
+        self.runs = 0
+        self.partitions_created = 0
+        self.partitions_dropped = 0
+        self.rows_deleted = 0
+        self.last_run_seconds = 0.0
+        self.last_error = None
+
+    async def prepare(self):
+        """ Called at startup after create_tables: detect partitioning and make the current partitions """
+        if not LOG_EVENTS_PARTITIONED:
+            return
+        async with engine.begin() as conn:
+            self.partitioned = bool(await conn.scalar(text(
+                "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'log_events'::regclass"
+            )))
+        if not self.partitioned:
+            print("log_events exists but is not partitioned; retention falls back to batched deletes")
+            return
+        await self.ensure_partitions()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error during log retention: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        started = time.perf_counter()
+        if self.partitioned:
+            await self.ensure_partitions()
+        if archiver.enabled:
+            partitions = []
+            if self.partitioned:
+                async with engine.begin() as conn:
+                    names = await self.partition_names(conn)
+                partitions = [(name, partition_day(name)) for name in names if partition_day(name)]
+            await archiver.run_once(partitions)
+        if self.retention_days > 0:
+            cutoff = int((datetime.now(timezone.utc).timestamp() - self.retention_days * 86400) * 1e6)
+            if self.partitioned:
+                await self.drop_partitions_before(cutoff)
+            # Covers SQLite, unpartitioned tables and whatever landed in the default partition
+            await self.delete_logs_before(cutoff)
+        self.runs += 1
+        self.last_run_seconds = time.perf_counter() - started
+
+    async def ensure_partitions(self):
+        today = datetime.now(timezone.utc).date()
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE IF NOT EXISTS log_events_default PARTITION OF log_events DEFAULT"))
+            existing = set(await self.partition_names(conn))
+        for offset in range(self.premake_days + 1):
+            day = today + timedelta(days=offset)
+            name = partition_name(day)
+            if name in existing:
+                continue
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF log_events "
+                        f"FOR VALUES FROM ({day_start(day)}) TO ({day_start(day + timedelta(days=1))})"
+                    ))
+                self.partitions_created += 1
+            except Exception as e:
+                # Typically rows for that day already sit in the default partition
+                print(f"Could not create log partition {name}: {e}")
+
+    async def partition_names(self, conn):
+        result = await conn.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'log_events'"
+        ))
+        return [name for name, in result.all()]
+
+    async def drop_partitions_before(self, cutoff: int):
+        """ Drop every daily partition that ends at or before the cutoff timestamp """
+        async with engine.begin() as conn:
+            names = await self.partition_names(conn)
+        for name in names:
+            day = partition_day(name)
+            if day is None or day_start(day + timedelta(days=1)) > cutoff:
+                continue
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    f"DELETE FROM gunshot_event_logs WHERE log_event_id IN (SELECT id FROM {name})"
+                ))
+                await conn.execute(text(f"ALTER TABLE log_events DETACH PARTITION {name}"))
+                await conn.execute(text(f"DROP TABLE {name}"))
+            self.partitions_dropped += 1
+            print(f"Dropped expired log partition {name}")
+
+    async def delete_logs_before(self, cutoff: int):
+        while True:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(LogEvent.id).where(LogEvent.timestamp < cutoff).limit(self.batch_rows)
+                )
+                log_ids = result.scalars().all()
+                if not log_ids:
+                    return
+                await db.execute(delete(GunshotEventLog).where(GunshotEventLog.log_event_id.in_(log_ids)))
+                await db.execute(delete(LogEvent).where(LogEvent.timestamp < cutoff, LogEvent.id.in_(log_ids)))
+                await db.commit()
+            self.rows_deleted += len(log_ids)
+            await asyncio.sleep(0)  # Let ingest get the writer between batches
+
+    def stats(self):
+        return {
+            "retention_days": self.retention_days,
+            "partitioned": self.partitioned,
+            "runs": self.runs,
+            "partitions_created": self.partitions_created,
+            "partitions_dropped": self.partitions_dropped,
+            "rows_deleted": self.rows_deleted,
+            "last_run_seconds": self.last_run_seconds,
+            "last_error": self.last_error,
+        }
+
+
+retention_job = RetentionJob()
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from app.core.config import settings
+from app.utils.microphone_registry import microphone_registry
+from app.utils.websocket_manager import manager
+
+# Sensor protocol over /ws:
+#   {"type": "sensor_update", "version": v, "sensors": [...]}  full snapshot, sent on connect and on resync
+#   {"type": "sensor_delta", "version": v, "base_version": b, "sensors": [...]}
+#       only the mics added or moved since b; apply it only when the client is at version b
+#   client -> server {"type": "resync"}                        asks for a fresh snapshot after a gap
+# Subscribed clients (see app/utils/subscriptions.py) only get the sensors inside their area,
+# so base_version may lag the previous version when deltas outside the area were skipped.
+
+def sensor_snapshot():
+    """ Full sensor list from the in-memory registry (no table scan) """
+    return {
+        "type": "sensor_update",
+        "version": microphone_registry.version,
+        "sensors": microphone_registry.snapshot(),
+    }
+
+async def send_sensor_snapshot(websocket):
+    """ Snapshot for one client, cut down to its subscribed area """
+    await manager.publish(sensor_snapshot(), "sensors", "sensor", websocket=websocket,
+                          send_empty=True, versioned=True)
+
+async def broadcast_sensor_snapshot():
+    microphone_registry.bump_version()
+    await manager.publish(sensor_snapshot(), "sensors", "sensor", send_empty=True, versioned=True)
+
+class SensorBroadcastScheduler:
+    """
+    Coalesces sensor changes: writers mark mics dirty and at most one
+    sensor_delta per interval is broadcast, carrying every mic that changed
+    since the previous one.
+    """
+
+    def __init__(self, interval_ms=settings.SENSOR_BROADCAST_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.dirty = {}  # mic_id -> (lat, lon), latest position wins
+        self.flush_task = None
+        self.last_flush = float("-inf")
+        self.broadcasts = 0
+        self.changes_marked = 0
+
+    def mark_dirty(self, changes: dict):
+        if not changes:
+            return
+        self.dirty.update(changes)
+        self.changes_marked += len(changes)
+        if self.flush_task is None or self.flush_task.done():
+            delay = max(0.0, self.last_flush + self.interval - time.monotonic())
+            self.flush_task = asyncio.create_task(self.flush_after(delay))
+
+    async def flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        changes, self.dirty = self.dirty, {}
+        self.last_flush = time.monotonic()
+        self.broadcasts += 1
+        await manager.publish({
+            "type": "sensor_delta",
+            "version": microphone_registry.bump_version(),
+            "sensors": [{"mic_id": mic_id, "lat": lat, "lon": lon} for mic_id, (lat, lon) in changes.items()],
+        }, "sensors", "sensor", versioned=True)
+
+    def discard_pending(self):
+        """ Forget queued changes, e.g. when every sensor has just been deleted """
+        self.dirty.clear()
+
+    def stats(self):
+        return {
+            "interval_ms": self.interval * 1000,
+            "pending": len(self.dirty),
+            "changes_marked": self.changes_marked,
+            "broadcasts": self.broadcasts,
+        }
+
+sensor_scheduler = SensorBroadcastScheduler()
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from sqlalchemy import select
+from app.models.log_event import LogEvent
+from app.utils.database import AsyncSessionLocal
+from app.utils.detect_gunshots import save_gunshot_events, group_logs, TIME_THRESHOLD
+from app.utils.gunshot_logs import is_unconsumed
+
+ALLOWED_LATENESS = 500_000  # 0.5 seconds in microseconds a log may arrive behind the newest one
+IDLE_TIMEOUT = 1  # seconds of wall time after which a quiet group is closed
+
+
+class StreamingGunshotDetector:
+    """
+    Groups logs as they are ingested instead of re-querying a window of the DB.
+
+    Open groups are kept in memory ordered by min_time. A group is closed once
+    it can no longer gain members: either the newest timestamp seen is past
+    min_time + TIME_THRESHOLD (+ lateness), or the group has been open for
+    longer than that in wall time. Closed groups with at least three unique
+    mic_ids are located, persisted and broadcast.
+    """
+
+    def __init__(self, time_threshold=TIME_THRESHOLD, allowed_lateness=ALLOWED_LATENESS,
+                 idle_timeout=IDLE_TIMEOUT):
+        self.time_threshold = time_threshold
+        self.allowed_lateness = allowed_lateness
+        self.idle_timeout = idle_timeout
+        self.open_groups = deque()
+        self.watermark = None  # Newest log timestamp seen so far, capped at wall-clock now
+
+    def add(self, log):
+        """Place a single log into the first open group that can take it."""
+        target = None
+        for group in self.open_groups:
+            if group["min_time"] - log.timestamp > self.time_threshold:
+                break  # Ordered by min_time, so no later group can take it either
+            if (
+                abs(log.timestamp - group["min_time"]) <= self.time_threshold
+                and abs(log.timestamp - group["max_time"]) <= self.time_threshold
+                and log.mic_id not in group["mic_ids"]
+            ):
+                target = group
+                break
+
+        if target is not None:
+            target["logs"].append(log)
+            target["min_time"] = min(target["min_time"], log.timestamp)
+            target["max_time"] = max(target["max_time"], log.timestamp)
+            target["mic_ids"].add(log.mic_id)
+        else:
+            new_group = {
+                "logs": [log],
+                "mic_ids": {log.mic_id},
+                "min_time": log.timestamp,
+                "max_time": log.timestamp,
+                "opened_at": time.monotonic(),
+            }
+            # Keep open groups ordered by min_time so expiry only looks at the front
+            position = len(self.open_groups)
+            while position > 0 and self.open_groups[position - 1]["min_time"] > log.timestamp:
+                position -= 1
+            self.open_groups.insert(position, new_group)
+
+        self.advance_watermark(log.timestamp)
+
+    def advance_watermark(self, timestamp):
+        # A sensor with a clock far ahead must not close everyone else's groups early,
+        # so the watermark never runs past wall-clock now (+ lateness)
+        ceiling = int(time.time() * 1e6) + self.allowed_lateness
+        timestamp = min(timestamp, ceiling)
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+
+    def retire_expired(self):
+        """Pop the groups at the front that the watermark has left behind."""
+        horizon = self.time_threshold + self.allowed_lateness
+        closed = []
+        while self.open_groups and self.watermark - self.open_groups[0]["min_time"] > horizon:
+            closed.append(self.open_groups.popleft())
+        return closed
+
+    def close_expired(self, force=False):
+        """Remove and return every group that can no longer gain members."""
+        horizon = self.time_threshold + self.allowed_lateness
+        max_open_seconds = horizon / 1e6 + self.idle_timeout
+        now = time.monotonic()
+
+        closed = []
+        remaining = deque()
+        for group in self.open_groups:
+            if (
+                force
+                or self.watermark - group["min_time"] > horizon
+                or now - group["opened_at"] > max_open_seconds
+            ):
+                closed.append(group)
+            else:
+                remaining.append(group)
+        self.open_groups = remaining
+        return closed
+
+    def discard_logs(self, max_log_id):
+        """Drop logs with id <= max_log_id (e.g. being purged) from the open groups."""
+        remaining = deque()
+        for group in self.open_groups:
+            logs = [log for log in group["logs"] if log.id > max_log_id]
+            if not logs:
+                continue
+            group["logs"] = logs
+            group["mic_ids"] = {log.mic_id for log in logs}
+            group["min_time"] = min(log.timestamp for log in logs)
+            group["max_time"] = max(log.timestamp for log in logs)
+            remaining.append(group)
+        # Still ordered by min_time, since the groups are kept sorted and min_time only grew
+        self.open_groups = deque(sorted(remaining, key=lambda group: group["min_time"]))
+
+    async def feed(self, logs):
+        """Add freshly committed logs and emit any groups they cause to close."""
+        closed = []
+        for log in sorted(logs, key=lambda l: l.timestamp):
+            self.add(log)
+            # Retire as we go so a large batch only ever compares against the current window
+            closed.extend(self.retire_expired())
+        closed.extend(self.close_expired())
+        await self.emit(closed)
+
+    async def flush(self, force=False):
+        """Close groups that have gone quiet; called periodically by the debounce loop."""
+        task = await self.emit(self.close_expired(force=force))
+        if force and task:
+            await task  # On shutdown, make sure the events reach the DB
+
+    async def emit(self, closed_groups):
+        grouped_events = [group["logs"] for group in closed_groups if len(group["mic_ids"]) >= 3]
+        if not grouped_events:
+            return None
+        return asyncio.create_task(save_gunshot_events(grouped_events, AsyncSessionLocal()))
+
+    async def recover(self, db):
+        """Reload the logs that may still belong to open groups after a restart."""
+        horizon = self.time_threshold + self.allowed_lateness
+        since = int(datetime.now(timezone.utc).timestamp() * 1e6) - horizon
+        result = await db.execute(
+            select(LogEvent)
+            .where(LogEvent.timestamp >= since, is_unconsumed())
+            .order_by(LogEvent.timestamp)
+        )
+        now = time.monotonic()
+        for group in group_logs(result.scalars().all(), self.time_threshold):
+            group["opened_at"] = now
+            self.open_groups.append(group)
+            self.advance_watermark(group["max_time"])
+
+
+stream_detector = StreamingGunshotDetector()
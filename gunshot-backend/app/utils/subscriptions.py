@@ -0,0 +1,153 @@
+import math
+
+GRID_CELL_DEGREES = 0.05  # Roughly 5.5 km cells; a district-sized box covers a handful
+MAX_INDEXED_CELLS = 4096  # Larger areas are kept in a short list and checked directly
+MESSAGE_KINDS = ("gunshot", "sensor")
+
+
+class Subscription:
+    """
+    What a WebSocket client wants to receive: an optional area (bounding box
+    or polygon) and an optional set of message kinds. No area means anywhere.
+    """
+
+    def __init__(self, bbox=None, polygon=None, kinds=None):
+        self.polygon = polygon  # [(lat, lon), ...] or None
+        if polygon and bbox is None:
+            lats = [lat for lat, _ in polygon]
+            lons = [lon for _, lon in polygon]
+            bbox = (min(lats), min(lons), max(lats), max(lons))
+        self.bbox = bbox  # (min_lat, min_lon, max_lat, max_lon) or None
+        self.kinds = set(kinds) if kinds else None
+
+    def wants(self, kind):
+        return self.kinds is None or kind in self.kinds
+
+    def contains(self, lat, lon):
+        if self.bbox is None:
+            return True
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            return False
+        return self.polygon is None or point_in_polygon(lat, lon, self.polygon)
+
+    def describe(self):
+        return {
+            "bbox": list(self.bbox) if self.bbox else None,
+            "polygon": [list(point) for point in self.polygon] if self.polygon else None,
+            "types": sorted(self.kinds) if self.kinds else None,
+        }
+
+
+def point_in_polygon(lat, lon, polygon):
+    """ Even-odd ray casting; polygon is a list of (lat, lon) vertices """
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat):
+            crossing = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+def parse_subscription(request: dict) -> Subscription:
+    """
+    Build a Subscription from a client message such as
+    {"type": "subscribe", "bbox": {"min_lat": .., "min_lon": .., "max_lat": .., "max_lon": ..},
+     "types": ["gunshot"]}  or  {"type": "subscribe", "polygon": [[lat, lon], ...]}.
+    Raises ValueError on malformed input.
+    """
+    bbox = None
+    polygon = None
+
+    if request.get("bbox") is not None:
+        box = request["bbox"]
+        try:
+            bbox = tuple(float(box[key]) for key in ("min_lat", "min_lon", "max_lat", "max_lon"))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("bbox needs numeric min_lat, min_lon, max_lat and max_lon")
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError("bbox minimums must not exceed its maximums")
+
+    if request.get("polygon") is not None:
+        try:
+            polygon = [(float(lat), float(lon)) for lat, lon in request["polygon"]]
+        except (TypeError, ValueError):
+            raise ValueError("polygon must be a list of [lat, lon] pairs")
+        if len(polygon) < 3:
+            raise ValueError("polygon needs at least three vertices")
+
+    for lat, lon in ([(bbox[0], bbox[1]), (bbox[2], bbox[3])] if bbox else []) + (polygon or []):
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("coordinates are out of range")
+
+    kinds = request.get("types")
+    if kinds is not None:
+        if not isinstance(kinds, list) or any(kind not in MESSAGE_KINDS for kind in kinds):
+            raise ValueError(f"types must be a list drawn from {list(MESSAGE_KINDS)}")
+
+    return Subscription(bbox=bbox, polygon=polygon, kinds=kinds)
+
+
+def cell_of(lat, lon):
+    return (math.floor(lat / GRID_CELL_DEGREES), math.floor(lon / GRID_CELL_DEGREES))
+
+
+class SubscriptionIndex:
+    """
+    Uniform lat/lon grid over subscription areas. Each client is registered in
+    every cell its bounding box touches, so routing a point only looks at the
+    clients in one cell instead of every connected client.
+    """
+
+    def __init__(self):
+        self.cells = {}  # (row, col) -> set of clients
+        self.wide = set()  # Subscriptions too large to index, or with no area at all
+        self.entries = {}  # client -> (Subscription, cells it was added to)
+
+    def add(self, client, subscription: Subscription):
+        self.remove(client)
+        cells = []
+        if subscription.bbox is not None:
+            min_row, min_col = cell_of(subscription.bbox[0], subscription.bbox[1])
+            max_row, max_col = cell_of(subscription.bbox[2], subscription.bbox[3])
+            if (max_row - min_row + 1) * (max_col - min_col + 1) <= MAX_INDEXED_CELLS:
+                cells = [(row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)]
+
+        if cells:
+            for cell in cells:
+                self.cells.setdefault(cell, set()).add(client)
+        else:
+            self.wide.add(client)
+        self.entries[client] = (subscription, cells)
+
+    def remove(self, client):
+        entry = self.entries.pop(client, None)
+        if entry is None:
+            return
+        _, cells = entry
+        if not cells:
+            self.wide.discard(client)
+        for cell in cells:
+            members = self.cells.get(cell)
+            if members is not None:
+                members.discard(client)
+                if not members:
+                    del self.cells[cell]
+
+    def match(self, lat, lon, kind):
+        """ Clients whose subscription covers the point and accepts this kind of message """
+        candidates = self.cells.get(cell_of(lat, lon), set()) | self.wide
+        matched = []
+        for client in candidates:
+            subscription = self.entries[client][0]
+            if subscription.wants(kind) and subscription.contains(lat, lon):
+                matched.append(client)
+        return matched
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,41 +1,209 @@
 from fastapi import WebSocket, APIRouter, WebSocketDisconnect
+from app.core.config import settings
+from app.utils.subscriptions import SubscriptionIndex
 import asyncio
+import json
 import logging
-from weakref import WeakSet
+
+try:
+    import orjson
+except ImportError:  # Optional fast encoder
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+def encode_message(message: dict) -> str:
+    """ Serialize a broadcast payload once, with orjson when it is installed """
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(message, separators=(",", ":"))
+
+def item_location(item: dict):
+    return item["lat"], item["lon"]
+
+class ClientConnection:
+    """ One connected client: a bounded outbound queue drained by its own writer task """
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.writer_task = None
+        self.subscription = None  # None receives everything
+        self.sensor_version = None  # Last sensor version this client was sent
+
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections = WeakSet()
+    def __init__(self, max_queue=settings.WS_QUEUE_SIZE, overflow_policy=settings.WS_OVERFLOW_POLICY):
+        if overflow_policy not in ("drop_oldest", "disconnect"):
+            raise ValueError(f"Unknown WebSocket overflow policy: {overflow_policy}")
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.active_connections = {}  # WebSocket -> ClientConnection
+        self.unfiltered = set()  # Clients without a subscription
+        self.subscriptions = SubscriptionIndex()  # Grid over the subscribed clients' areas
         self.lock = asyncio.Lock()
 
+        self.messages_enqueued = 0
+        self.messages_dropped = 0
+        self.clients_dropped = 0
+
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
+        client = ClientConnection(websocket, self.max_queue)
+        client.writer_task = asyncio.create_task(self.writer(client))
         async with self.lock:
-            self.active_connections.add(websocket)
+            self.active_connections[websocket] = client
+            self.unfiltered.add(client)
+
+    def forget(self, websocket: WebSocket):
+        """ Stop routing to a client; returns its ClientConnection if it was still registered """
+        client = self.active_connections.pop(websocket, None)
+        if client:
+            self.unfiltered.discard(client)
+            self.subscriptions.remove(client)
+        return client
 
     async def disconnect(self, websocket: WebSocket):
         async with self.lock:
-            if websocket in self.active_connections:
-                self.active_connections.remove(websocket)
+            client = self.forget(websocket)
+        if client and client.writer_task is not asyncio.current_task():
+            client.writer_task.cancel()
+
+    def subscribe(self, websocket: WebSocket, subscription):
+        """ Limit a client to one area and/or message kinds; None goes back to receiving everything """
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return
+        client.subscription = subscription
+        if subscription is None:
+            self.subscriptions.remove(client)
+            self.unfiltered.add(client)
+        else:
+            self.unfiltered.discard(client)
+            self.subscriptions.add(client, subscription)
+
+    async def writer(self, client: ClientConnection):
+        """ Send queued messages to one client; a slow client only delays itself """
+        while True:
+            message = await client.queue.get()
+            try:
+                await client.websocket.send_text(message)
+            except Exception as e:
+                logger.error(f"Error sending message to WebSocket: {e}")
+                await self.disconnect(client.websocket)
+                return
+
+    def enqueue(self, client: ClientConnection, message: str):
+        """ Queue an encoded message for one client, applying the overflow policy when it is full """
+        try:
+            client.queue.put_nowait(message)
+            self.messages_enqueued += 1
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow_policy == "drop_oldest":
+            client.queue.get_nowait()
+            client.queue.put_nowait(message)
+            self.messages_enqueued += 1
+            self.messages_dropped += 1
+        else:
+            logger.warning("WebSocket client fell behind; disconnecting")
+            self.clients_dropped += 1
+            # Stop routing to it right away; closing the socket happens in the background
+            self.forget(client.websocket)
+            asyncio.create_task(self.drop(client))
+
+    async def drop(self, client: ClientConnection):
+        client.writer_task.cancel()
+        try:
+            await client.websocket.close()
+        except Exception:
+            pass
+
+    async def send(self, websocket: WebSocket, message: dict):
+        """ Queue a message for a single client """
+        client = self.active_connections.get(websocket)
+        if client:
+            self.enqueue(client, encode_message(message))
 
     async def broadcast(self, message: dict):
-        async with self.lock:
-            disconnected_clients = []
-            for ws in self.active_connections:
-                try:
-                    await ws.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error sending message to WebSocket: {e}")
-                    disconnected_clients.append(ws)
-            for ws in disconnected_clients:
-                await self.disconnect(ws)
+        # Encode once and enqueue the same text for everyone; the writer tasks do the network I/O
+        if not self.active_connections:
+            return
+        text = encode_message(message)
+        for client in list(self.active_connections.values()):
+            self.enqueue(client, text)
+
+    async def publish(self, message: dict, key: str, kind: str, locate=item_location,
+                      websocket: WebSocket = None, send_empty=False, versioned=False):
+        """
+        Route a message whose message[key] is a list of located items. Clients
+        without a subscription get it whole; subscribed clients, found through
+        the grid index, get only the items inside their area and are skipped
+        when none are (unless send_empty). With versioned, each copy carries
+        the base_version the client must be at before applying it.
+        """
+        items = message[key]
+        if websocket is not None:
+            client = self.active_connections.get(websocket)
+            if client is None:
+                return
+            full = [client] if client.subscription is None else []
+            partial = {}
+            if client.subscription is not None and client.subscription.wants(kind):
+                partial[client] = [
+                    i for i, item in enumerate(items) if client.subscription.contains(*locate(item))
+                ]
+        else:
+            full = list(self.unfiltered)
+            partial = {}
+            if send_empty:
+                partial = {
+                    client: [] for client, (subscription, _) in self.subscriptions.entries.items()
+                    if subscription.wants(kind)
+                }
+            for i, item in enumerate(items):
+                lat, lon = locate(item)
+                for client in self.subscriptions.match(lat, lon, kind):
+                    partial.setdefault(client, []).append(i)
+
+        # Clients that receive the same items (and base version) share one encoding
+        encoded = {}
+        recipients = [(client, None) for client in full]
+        recipients += [(client, tuple(indexes)) for client, indexes in partial.items() if indexes or send_empty]
+        for client, indexes in recipients:
+            base_version = client.sensor_version if versioned else None
+            cache_key = (indexes, base_version)
+            text = encoded.get(cache_key)
+            if text is None:
+                payload = message if indexes is None else {**message, key: [items[i] for i in indexes]}
+                if versioned:
+                    payload = {**payload, "base_version": base_version}
+                text = encoded[cache_key] = encode_message(payload)
+            if versioned:
+                client.sensor_version = message["version"]
+            self.enqueue(client, text)
 
     async def disconnect_all(self):
         async with self.lock:
-            for ws in self.active_connections:
-                await ws.close()
+            clients = list(self.active_connections.values())
             self.active_connections.clear()
+            self.unfiltered.clear()
+            self.subscriptions = SubscriptionIndex()
+        for client in clients:
+            client.writer_task.cancel()
+            await client.websocket.close()
+
+    def stats(self):
+        return {
+            "clients": len(self.active_connections),
+            "subscribed_clients": len(self.subscriptions),
+            "overflow_policy": self.overflow_policy,
+            "max_queue": self.max_queue,
+            "queued": sum(client.queue.qsize() for client in self.active_connections.values()),
+            "messages_enqueued": self.messages_enqueued,
+            "messages_dropped": self.messages_dropped,
+            "clients_dropped": self.clients_dropped,
+        }
 
-manager = WebSocketManager()
\ No newline at end of file
+manager = WebSocketManager()
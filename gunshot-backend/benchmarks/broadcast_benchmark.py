@@ -0,0 +1,70 @@
+"""
+Per-broadcast CPU cost against client count.
+
+Compares the old behaviour (send_json, i.e. one JSON encode per client) with
+WebSocketManager.broadcast, which encodes once and queues the same text for
+every client. Sockets are in-memory stand-ins, so only server-side CPU time
+is measured.
+
+    python -m benchmarks.broadcast_benchmark
+"""
+import asyncio
+import json
+import random
+import time
+from app.utils.websocket_manager import WebSocketManager, orjson
+
+class NullWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        json.dumps(message, separators=(",", ":"))  # What starlette does per client
+
+    async def send_text(self, text):
+        pass
+
+    async def close(self):
+        pass
+
+def sensor_payload(n_sensors=500):
+    return {
+        "type": "sensor_update",
+        "sensors": [
+            {"mic_id": i, "lat": 42 + random.random(), "lon": -83 + random.random()}
+            for i in range(n_sensors)
+        ],
+    }
+
+async def per_client_encode(sockets, message):
+    for ws in sockets:
+        await ws.send_json(message)
+
+async def run(client_counts=(1, 10, 50, 100, 200), repeats=3):
+    message = sensor_payload()
+    encoder = "orjson" if orjson is not None else "json"
+    print(f"payload: {len(json.dumps(message)) / 1024:.0f} KiB, encoder: {encoder}")
+    print(f"{'clients':>8} {'per-client ms':>14} {'encode-once ms':>15}")
+
+    for count in client_counts:
+        sockets = [NullWebSocket() for _ in range(count)]
+
+        started = time.process_time()
+        for _ in range(repeats):
+            await per_client_encode(sockets, message)
+        legacy = (time.process_time() - started) / repeats
+
+        manager = WebSocketManager(max_queue=repeats + 1)
+        for ws in sockets:
+            await manager.connect(ws)
+        started = time.process_time()
+        for _ in range(repeats):
+            await manager.broadcast(message)
+        await asyncio.sleep(0)  # Let the writer tasks drain
+        encode_once = (time.process_time() - started) / repeats
+        await manager.disconnect_all()
+
+        print(f"{count:>8} {legacy * 1e3:>14.2f} {encode_once * 1e3:>15.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,104 @@
+"""
+Log ingest throughput on SQLite while readers page through /get_all_logs-style
+queries, for the default profile (rollback journal, one shared pool) and the
+tuned one (WAL + pragmas, a single writer connection and a read pool).
+
+Each run uses a fresh database file in a temporary directory, pre-filled
+with some history so the readers have real pages to scan.
+
+    python -m benchmarks.sqlite_benchmark
+"""
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import select
+from app.models.base import Base
+from app.models.log_event import LogEvent
+from app.utils.database import sqlite_engines, session_factory
+
+PREFILL_ROWS = 50_000
+BATCH_ROWS = 100  # Roughly what the ingest buffer commits per flush under load
+PAGE_SIZE = 1000
+
+async def prefill(session_maker, rows):
+    async with session_maker() as db:
+        for start in range(0, rows, 5000):
+            await db.execute(LogEvent.__table__.insert(), [
+                {"timestamp": i, "lat": 42.0, "lon": -83.0, "mic_id": i % 1000}
+                for i in range(start, min(start + 5000, rows))
+            ])
+        await db.commit()
+
+async def writer(session_maker, stop, latencies, next_timestamp):
+    rows = 0
+    while not stop.is_set():
+        batch = [
+            {"timestamp": next_timestamp + i, "lat": 42.0, "lon": -83.0, "mic_id": random.randrange(1000)}
+            for i in range(BATCH_ROWS)
+        ]
+        next_timestamp += BATCH_ROWS
+        started = time.perf_counter()
+        async with session_maker() as db:
+            await db.execute(LogEvent.__table__.insert(), batch)
+            await db.commit()
+        latencies.append(time.perf_counter() - started)
+        rows += BATCH_ROWS
+    return rows
+
+async def reader(session_maker, stop):
+    pages = 0
+    while not stop.is_set():
+        # Walk the table a page at a time the way a paginated /get_all_logs client does
+        start = random.randrange(PREFILL_ROWS)
+        async with session_maker() as db:
+            result = await db.execute(
+                select(LogEvent.id, LogEvent.timestamp, LogEvent.lat, LogEvent.lon, LogEvent.mic_id)
+                .where(LogEvent.timestamp >= start)
+                .order_by(LogEvent.timestamp, LogEvent.id)
+                .limit(PAGE_SIZE)
+            )
+            result.all()
+        pages += 1
+    return pages
+
+async def run_profile(profile, readers, duration):
+    with tempfile.TemporaryDirectory() as directory:
+        write_engine, read_engine = sqlite_engines(os.path.join(directory, "bench.db"), profile)
+        session_maker = session_factory(write_engine, read_engine)
+        async with write_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await prefill(session_maker, PREFILL_ROWS)
+
+        stop = asyncio.Event()
+        latencies = []
+        tasks = [asyncio.create_task(writer(session_maker, stop, latencies, PREFILL_ROWS))]
+        tasks += [asyncio.create_task(reader(session_maker, stop)) for _ in range(readers)]
+        await asyncio.sleep(duration)
+        stop.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        await write_engine.dispose()
+        if read_engine is not write_engine:
+            await read_engine.dispose()
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    rows = results[0] if not isinstance(results[0], Exception) else 0
+    pages = sum(r for r in results[1:] if not isinstance(r, Exception))
+    p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) >= 2 else float("nan")
+    return rows / duration, pages / duration, p99, errors
+
+async def run(reader_counts=(0, 2, 4, 8), duration=5):
+    print(f"{'profile':>8} {'readers':>8} {'rows/s':>10} {'pages/s':>9} {'p99 commit ms':>14}")
+    for readers in reader_counts:
+        for profile in ("default", "tuned"):
+            rows_per_second, pages_per_second, p99, errors = await run_profile(profile, readers, duration)
+            line = f"{profile:>8} {readers:>8} {rows_per_second:>10.0f} {pages_per_second:>9.1f} {p99 * 1e3:>14.1f}"
+            if errors:
+                line += f"  ({len(errors)} task(s) failed: {errors[0]})"
+            print(line)
+
+if __name__ == "__main__":
+    asyncio.run(run())
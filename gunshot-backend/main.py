@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
@@ -8,11 +9,38 @@ from app.routes.delete_all import router as delete_all
 from app.routes.get_all_logs import router as get_all_logs
 from app.routes.test_points import router as test_points_router
 from app.routes.websocket  import router as ws_router
-
-app = FastAPI()
+from app.routes.metrics    import router as metrics_router
+from app.routes.export     import router as export_router
+from app.routes.history    import router as history_router
 
 from app.utils.database import create_tables
-from app.utils.database import engine
+from app.utils.database import dispose_engines, AsyncSessionLocal
+from app.utils.stream_detector import stream_detector
+from app.utils.localization_executor import localization_executor
+from app.utils.ingest_buffer import ingest_buffer
+from app.utils.microphone_registry import microphone_registry
+from app.utils.retention import retention_job
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: create tables, load the mic registry and reload logs that may still form a gunshot
+    await create_tables()
+    await retention_job.prepare()
+    async with AsyncSessionLocal() as db:
+        await microphone_registry.load(db)
+        await stream_detector.recover(db)
+    retention_job.start()
+    yield
+    # Shutdown: emit whatever is still open, then dispose engine
+    print("Shutting down the application…")
+    await retention_job.stop()
+    await ingest_buffer.close()
+    await stream_detector.flush(force=True)
+    localization_executor.shutdown()
+    await dispose_engines()
+    print("Database connections closed.")
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Middleware
 app.add_middleware(
@@ -21,6 +49,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Lets the browser read pagination cursors
 )
 
 # Include routers
@@ -31,15 +60,9 @@ app.include_router(get_all_logs)
 app.include_router(test_points_router)
 app.include_router(delete_all)
 app.include_router(ws_router)
-
-async def lifespan(app: FastAPI):
-    # Startup: create tables
-    await create_tables()
-    yield
-    # Shutdown: dispose engine
-    print("Shutting down the application…")
-    await engine.dispose()
-    print("Database connections closed.")
+app.include_router(metrics_router)
+app.include_router(export_router)
+app.include_router(history_router)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
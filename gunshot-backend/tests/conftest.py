@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Settings are read at import time, so point the app at throwaway storage before anything imports it
+_scratch = tempfile.mkdtemp(prefix="gunshot-tests-")
+os.environ.setdefault("SQLITE_PATH", os.path.join(_scratch, "gunshot.db"))
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(_scratch, "archive"))
+os.environ.setdefault("LOCALIZATION_EXECUTOR", "thread")
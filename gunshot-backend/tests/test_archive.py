@@ -0,0 +1,201 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+import main
+from app.models.gunshot_event import GunshotEvent
+from app.models.gunshot_event_log import GunshotEventLog
+from app.models.log_event import LogEvent
+from app.routes.history import union_columns
+from app.utils import archive
+from app.utils.archive import ArchiveStore, archiver, day_start, to_columns
+from app.utils.database import AsyncSessionLocal
+from app.utils.retention import retention_job
+from app.utils.gunshot_logs import log_dict
+
+DAY = 86_400_000_000
+
+
+@pytest.fixture(params=["parquet", "npz"])
+def client(request, monkeypatch, tmp_path):
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow")
+    else:
+        monkeypatch.setattr(archive, "pyarrow", None)
+        monkeypatch.setattr(archiver.store, "extension", ".npz")
+    monkeypatch.setattr(archiver, "after_days", 2)
+    monkeypatch.setattr(archiver.store, "root", str(tmp_path))
+    # The tests run the archiver themselves; the background job would race them
+    monkeypatch.setattr(retention_job, "start", lambda: None)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def old_timestamp(days_ago, offset):
+    return day_start(datetime.now(timezone.utc).date() - timedelta(days=days_ago)) + offset
+
+
+async def add_logs(timestamps, first_mic):
+    async with AsyncSessionLocal() as db:
+        logs = [
+            LogEvent(timestamp=timestamp, lat=42.0 + n * 0.001, lon=-83.0, mic_id=first_mic + n)
+            for n, timestamp in enumerate(timestamps)
+        ]
+        db.add_all(logs)
+        await db.commit()
+        return [log_dict(log) for log in logs]
+
+
+async def add_event(timestamp, logs, legacy):
+    """A located event; legacy ones (written before gunshot_event_logs) only carry the JSON copy."""
+    async with AsyncSessionLocal() as db:
+        event = GunshotEvent(timestamp=timestamp, lat=42.001, lon=-83.0, logs=logs if legacy else None)
+        db.add(event)
+        await db.flush()
+        if not legacy:
+            await db.execute(insert(GunshotEventLog), [
+                {"gunshot_event_id": event.id, "log_event_id": log["id"]} for log in logs
+            ])
+        await db.commit()
+        return event.id
+
+
+def history(client, kind, start, end):
+    response = client.get(f"/history/{kind}", params={"start": start, "end": end})
+    assert response.status_code == 200
+    return response.json()["columns"]
+
+
+def test_archived_events_keep_their_logs(client):
+    base = old_timestamp(5, 3_600_000_000)
+    legacy_logs = client.portal.call(add_logs, [base + 10, base + 20, base + 30], 900)
+    linked_logs = client.portal.call(add_logs, [base + 5_000_010, base + 5_000_020, base + 5_000_030], 900)
+    legacy_id = client.portal.call(add_event, base, legacy_logs, True)
+    linked_id = client.portal.call(add_event, base + 5_000_000, linked_logs, False)
+
+    before = {event_id: client.get(f"/gunshot_events/{event_id}").json() for event_id in (legacy_id, linked_id)}
+    client.portal.call(archiver.run_once)
+    after = {event_id: client.get(f"/gunshot_events/{event_id}").json() for event_id in (legacy_id, linked_id)}
+
+    assert after == before
+    assert [log["id"] for log in after[legacy_id]["logs"]] == [log["id"] for log in legacy_logs]
+
+    logs = history(client, "logs", base, base + DAY)
+    owners = dict(zip(logs["id"], logs["gunshot_event_id"]))
+    assert [owners[log["id"]] for log in legacy_logs] == [legacy_id] * 3
+    assert [owners[log["id"]] for log in linked_logs] == [linked_id] * 3
+
+    events = history(client, "gunshot_events", base, base + DAY)
+    legacy = events["id"].index(legacy_id)
+    assert [log["id"] for log in events["logs"][legacy]] == [log["id"] for log in legacy_logs]
+    assert events["logs"][events["id"].index(linked_id)] is None
+
+
+def test_event_straddling_the_cutoff_is_archived_with_all_its_logs(client, monkeypatch):
+    cutoff = archiver.cutoff()
+    logs = client.portal.call(add_logs, [cutoff - 100_000, cutoff, cutoff + 100_000], 950)
+    event_id = client.portal.call(add_event, cutoff - 200_000, logs, False)
+    expected = [log["id"] for log in logs]
+
+    # Two of its logs are still live, so the event and all three logs wait
+    client.portal.call(archiver.run_once)
+    assert [log["id"] for log in client.get(f"/gunshot_events/{event_id}").json()["logs"]] == expected
+    assert archiver.store.find_event(event_id) is None
+
+    # A day later the whole group goes at once
+    monkeypatch.setattr(archiver, "after_days", 1)
+    client.portal.call(archiver.run_once)
+    assert [log["id"] for log in archiver.store.find_event(event_id)["logs"]] == expected
+    assert [log["id"] for log in client.get(f"/gunshot_events/{event_id}").json()["logs"]] == expected
+    owners = history(client, "logs", cutoff - DAY, cutoff + DAY)
+    owners = dict(zip(owners["id"], owners["gunshot_event_id"]))
+    assert [owners[log_id] for log_id in expected] == [event_id] * 3
+
+
+def test_unknown_event_is_still_404(client):
+    assert client.get("/gunshot_events/987654321").status_code == 404
+
+
+def test_union_keeps_rows_whose_ids_collide():
+    # A SQLite table created before AUTOINCREMENT can hand an archived id out again
+    archived = to_columns("log_events", [(7, 1_000, 42.0, -83.0, 1, -1), (8, 2_000, 42.0, -83.0, 2, 3)])
+    live = to_columns("log_events", [(8, 2_000, 42.0, -83.0, 2, 3), (7, 9_000, 42.5, -83.0, 4, None)])
+
+    result = union_columns("log_events", archived, live, limit=10)
+
+    assert result["columns"]["id"] == [7, 8, 7]
+    assert result["columns"]["timestamp"] == [1_000, 2_000, 9_000]
+    assert result["columns"]["gunshot_event_id"] == [None, 3, None]
+
+
+def test_files_without_the_logs_column_still_read(tmp_path):
+    store = ArchiveStore(root=str(tmp_path))
+    day = datetime(2024, 1, 1).date()
+    path = store.path("gunshot_events", day, ".npz")
+    (tmp_path / "gunshot_events").mkdir()
+    np.savez_compressed(path, id=np.array([1]), timestamp=np.array([5]), lat=np.array([42.0]), lon=np.array([-83.0]))
+
+    events = store.read_day("gunshot_events", day)
+
+    assert events["logs"].tolist() == [""]
+    assert store.find_event(1)["logs"] == []
+
+
+def test_archive_files_are_read_and_written_off_the_event_loop(client, monkeypatch):
+    base = old_timestamp(5, 7_200_000_000)
+    logs = client.portal.call(add_logs, [base + 10, base + 20, base + 30], 960)
+    client.portal.call(add_event, base, logs, False)
+
+    # Make every file access slow enough that running it on the loop would stall it
+    def slowly(method):
+        def wrapper(*args, **kwargs):
+            time.sleep(0.3)
+            return method(*args, **kwargs)
+        return wrapper
+    monkeypatch.setattr(archiver.store, "read_day", slowly(archiver.store.read_day))
+    monkeypatch.setattr(archiver.store, "write_day", slowly(archiver.store.write_day))
+
+    async def scenario():
+        gaps = []
+
+        async def ticker():
+            while True:
+                before = time.perf_counter()
+                await asyncio.sleep(0.01)
+                gaps.append(time.perf_counter() - before)
+
+        ticking = asyncio.create_task(ticker())
+        try:
+            await archiver.run_once()
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                response = await http.get("/history/logs", params={"start": base, "end": base + DAY})
+                assert response.json()["count"] >= 3
+        finally:
+            ticking.cancel()
+        return max(gaps)
+
+    assert client.portal.call(scenario) < 0.2
+
+
+def test_scan_stops_reading_days_once_it_has_enough_rows(tmp_path, monkeypatch):
+    store = ArchiveStore(root=str(tmp_path))
+    first = datetime(2024, 1, 1).date()
+    for offset in range(5):
+        day = first + timedelta(days=offset)
+        start = day_start(day)
+        store.write_day("log_events", day, to_columns("log_events", [
+            (offset * 10 + n, start + n, 42.0, -83.0, n, -1) for n in range(2)
+        ]))
+    read = []
+    read_day = store.read_day
+    monkeypatch.setattr(store, "read_day", lambda kind, day: read.append(day) or read_day(kind, day))
+
+    rows = store.scan("log_events", day_start(first), day_start(first + timedelta(days=5)), limit=3)
+
+    assert read == [first, first + timedelta(days=1)]
+    assert rows["id"].tolist() == [0, 1, 10, 11]
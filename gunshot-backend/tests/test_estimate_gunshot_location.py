@@ -0,0 +1,87 @@
+from collections import namedtuple
+import numpy as np
+import pytest
+from app.utils.estimate_gunshot_location import (
+    METERS_PER_DEGREE, SPEED_OF_SOUND,
+    estimate_gunshot_location, estimate_gunshot_location_powell, estimate_gunshot_locations,
+)
+
+SensorLog = namedtuple("SensorLog", ["lat", "lon", "timestamp", "mic_id"])
+
+LAT0, LON0 = 42.3, -83.0
+METERS_PER_DEGREE_LON = METERS_PER_DEGREE * np.cos(np.radians(LAT0))
+
+
+def synthetic_groups(count, seed=0, spread=300.0, jitter_us=200):
+    """Random shots inside a square of sensors, with arrival times jittered by jitter_us."""
+    rng = np.random.default_rng(seed)
+    groups, sources = [], []
+    for _ in range(count):
+        sensors = rng.integers(3, 9)
+        east, north = rng.uniform(-spread, spread, sensors), rng.uniform(-spread, spread, sensors)
+        source = rng.uniform(-spread, spread, 2)
+        delay = np.hypot(east - source[0], north - source[1]) / SPEED_OF_SOUND * 1e6
+        timestamps = 1_700_000_000_000_000 + (delay + rng.normal(0, jitter_us, sensors)).astype(np.int64)
+        groups.append([
+            SensorLog(LAT0 + n / METERS_PER_DEGREE, LON0 + e / METERS_PER_DEGREE_LON, int(t), mic_id)
+            for mic_id, (e, n, t) in enumerate(zip(east, north, timestamps))
+        ])
+        sources.append({"lat": LAT0 + source[1] / METERS_PER_DEGREE, "lon": LON0 + source[0] / METERS_PER_DEGREE_LON})
+    return groups, sources
+
+
+def distances(a, b):
+    """Metres between two lists of {"lat", "lon"} fixes."""
+    return np.array([
+        np.hypot((p["lat"] - q["lat"]) * METERS_PER_DEGREE, (p["lon"] - q["lon"]) * METERS_PER_DEGREE_LON)
+        for p, q in zip(a, b)
+    ])
+
+
+@pytest.fixture(scope="module")
+def groups():
+    return synthetic_groups(100)
+
+
+@pytest.fixture(scope="module")
+def powell(groups):
+    return [estimate_gunshot_location_powell(group) for group in groups[0]]
+
+
+def test_matches_powell_under_its_bounds(groups, powell):
+    legacy = [estimate_gunshot_location(group, early_emission=False) for group in groups[0]]
+
+    gap = distances(legacy, powell)
+    # Powell stops at ~1e-4 degrees (about 10 m), so only its precision separates the two
+    assert np.median(gap) <= 2.0
+    assert np.percentile(gap, 90) <= 10.0
+
+
+def test_early_emission_moves_fixes_towards_the_source(groups, powell):
+    shots, sources = groups
+    early = [estimate_gunshot_location(group) for group in shots]
+
+    # The documented change: letting the shot predate its first arrival removes
+    # the Powell bound's bias, so fixes land far closer to the true source
+    assert np.median(distances(early, sources)) <= 20.0
+    assert np.median(distances(early, sources)) < np.median(distances(powell, sources)) / 4
+
+
+@pytest.mark.parametrize("early_emission", [True, False])
+def test_batch_solver_matches_single_solver(groups, early_emission):
+    shots = groups[0] + [shots[:2] for shots in groups[0][:3]]  # Plus a few unsolvable two-log groups
+    single = []
+    for group in shots:
+        if len(group) < 3:
+            single.append(None)
+            continue
+        single.append(estimate_gunshot_location(group, early_emission=early_emission))
+    batch = estimate_gunshot_locations(shots, early_emission=early_emission)
+
+    for one, many in zip(single, batch):
+        if one is None:
+            assert many["lat"] is None and not many["converged"]
+            continue
+        assert many["converged"]
+        assert many["time"] == one["time"]  # Same rounding, even for emission before the first arrival
+        assert distances([one], [many])[0] < 1e-3
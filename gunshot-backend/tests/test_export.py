@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+import main
+from app.core.config import settings
+from app.routes import export
+from app.utils import database
+
+
+@pytest.mark.skipif(database.read_engine is database.engine,
+                    reason="separate export connections only exist with the tuned SQLite profile")
+def test_exports_have_their_own_connections():
+    async def scenario():
+        # Every export connection busy, as with that many slow downloads in flight
+        exports = [await database.export_engine.connect() for _ in range(settings.EXPORT_MAX_CONCURRENT)]
+        try:
+            # ... and every read connection is still available to the rest of the API
+            reads = [
+                await asyncio.wait_for(database.read_engine.connect(), timeout=1)
+                for _ in range(settings.SQLITE_READ_POOL_SIZE)
+            ]
+            for connection in reads:
+                assert await connection.scalar(text("SELECT 1")) == 1
+                await connection.close()
+        finally:
+            for connection in exports:
+                await connection.close()
+        await database.dispose_engines()
+
+    assert database.export_engine is not database.read_engine
+    asyncio.run(scenario())
+
+
+def test_export_is_refused_when_all_slots_are_taken(monkeypatch):
+    monkeypatch.setattr(export, "active_exports", settings.EXPORT_MAX_CONCURRENT)
+    client = TestClient(main.app)
+
+    response = client.get("/export/logs")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "10"
+
+
+def test_export_streams_logs_and_releases_its_slot():
+    logs = [{"timestamp": 1_700_000_100_000_000 + i, "lat": 42.0, "lon": -83.0, "mic_id": 500 + i} for i in range(5)]
+    with TestClient(main.app) as client:
+        client.post("/log_events", json=logs, headers={"x-api-key": "DEFAULT_API_KEY_1234"})
+        response = client.get("/export/logs", params={"start": 1_700_000_100_000_000, "format": "csv"})
+
+    assert response.status_code == 200
+    assert len(response.text.strip().splitlines()) == 1 + len(logs)
+    assert export.active_exports == 0
@@ -0,0 +1,83 @@
+import random
+import pytest
+from app.models.log_event import LogEvent
+from app.utils.detect_gunshots import group_logs, TIME_THRESHOLD
+
+
+def reference_group_logs(logs, time_threshold=TIME_THRESHOLD):
+    """The original O(logs x groups) loop from detect_gunshots, kept verbatim as the oracle."""
+    active_groups = []
+
+    for log in logs:
+        added_to_group = False
+        merge_candidates = []
+
+        for group in active_groups:
+            if (
+                abs(log.timestamp - group["min_time"]) <= time_threshold
+                and abs(log.timestamp - group["max_time"]) <= time_threshold
+                and log.mic_id not in group["mic_ids"]
+            ):
+                merge_candidates.append(group)
+
+        if merge_candidates:
+            target_group = merge_candidates[0]  # Merge into the closest existing group
+            target_group["logs"].append(log)
+            target_group["min_time"] = min(target_group["min_time"], log.timestamp)
+            target_group["max_time"] = max(target_group["max_time"], log.timestamp)
+            target_group["mic_ids"].add(log.mic_id)
+            added_to_group = True
+
+        if not added_to_group:
+            active_groups.append({
+                "logs": [log],
+                "mic_ids": {log.mic_id},
+                "min_time": log.timestamp,
+                "max_time": log.timestamp
+            })
+
+    return active_groups
+
+
+def random_window(rng, count, span, mics):
+    """count timestamp-sorted logs over span microseconds; repeated timestamps are allowed."""
+    logs = [
+        LogEvent(id=i, timestamp=rng.randrange(span), lat=42.0, lon=-83.0, mic_id=rng.randrange(mics))
+        for i in range(count)
+    ]
+    return sorted(logs, key=lambda log: log.timestamp)
+
+
+def summary(groups):
+    """Groups as comparable values, in output order: (log ids, min_time, max_time, mic_ids)."""
+    return [
+        ([log.id for log in group["logs"]], group["min_time"], group["max_time"], sorted(group["mic_ids"]))
+        for group in groups
+    ]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_group_logs_matches_reference_on_random_windows(seed):
+    rng = random.Random(seed)
+    # From sparse to very dense windows, with few and many mics
+    logs = random_window(
+        rng,
+        count=rng.choice([0, 1, 10, 200, 2000]),
+        span=rng.choice([500_000, 2_000_000, 30_000_000]),
+        mics=rng.choice([3, 8, 60]),
+    )
+    threshold = rng.choice([TIME_THRESHOLD, 250_000])
+
+    assert summary(group_logs(logs, threshold)) == summary(reference_group_logs(logs, threshold))
+
+
+def test_group_logs_keeps_the_three_mic_events():
+    rng = random.Random(99)
+    logs = random_window(rng, count=5000, span=60_000_000, mics=20)
+
+    def events(groups):
+        return [[log.id for log in group["logs"]] for group in groups if len(group["mic_ids"]) >= 3]
+
+    expected = events(reference_group_logs(logs))
+    assert expected  # The window is dense enough to contain events
+    assert events(group_logs(logs)) == expected
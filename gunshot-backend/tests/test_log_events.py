@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+import main
+from app.core.config import settings
+
+API_KEY = {"x-api-key": "DEFAULT_API_KEY_1234"}
+
+
+def make_logs(count):
+    return [
+        {"timestamp": 1_700_000_000_000_000 + i, "lat": 42.0, "lon": -83.0, "mic_id": i}
+        for i in range(count)
+    ]
+
+
+def test_log_events_rejects_batches_over_the_limit(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_EVENTS_MAX_BATCH", 3)
+    client = TestClient(main.app)
+
+    response = client.post("/log_events", json=make_logs(4), headers=API_KEY)
+
+    assert response.status_code == 413
+    assert "limit of 3" in response.json()["error"]
+
+
+def test_log_events_accepts_a_batch_at_the_limit(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_EVENTS_MAX_BATCH", 3)
+    with TestClient(main.app) as client:
+        response = client.post("/log_events", json=make_logs(3), headers=API_KEY)
+
+    assert response.status_code == 200
+    assert [item["index"] for item in response.json()["accepted"]] == [0, 1, 2]
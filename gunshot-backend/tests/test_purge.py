@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+import main
+from app.models.microphone import Microphone
+from app.utils.database import AsyncSessionLocal, upsert
+from app.utils.purge import PurgeJob
+
+API_KEY = {"x-api-key": "DEFAULT_API_KEY_1234"}
+
+
+def test_chunked_purge_keeps_microphones_written_while_it_runs():
+    job = PurgeJob(chunk_rows=1)
+    logs = [
+        {"timestamp": 1_700_000_200_000_000 + i, "lat": 42.0 + i * 0.01, "lon": -83.0, "mic_id": 700 + i}
+        for i in range(3)
+    ]
+
+    async def write_meanwhile(positions):
+        # What /log_event would do mid-purge: move an existing mic and add one with a lower id
+        async with AsyncSessionLocal() as db:
+            await db.execute(upsert(Microphone, ["mic_id"], mic_id=701, lat=43.0, lon=-83.0))
+            await db.execute(upsert(Microphone, ["mic_id"], mic_id=5, lat=44.0, lon=-83.0))
+            await db.commit()
+        await delete_microphones(positions)
+
+    delete_microphones = job.delete_microphones
+    job.delete_microphones = write_meanwhile
+
+    async def purge():
+        job.start()
+        await job.task
+
+    async def remaining_microphones():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Microphone.mic_id, Microphone.lat))
+            return {mic_id: lat for mic_id, lat in result.all()}
+
+    with TestClient(main.app) as client:
+        client.post("/log_events", json=logs, headers=API_KEY)
+        before = client.portal.call(remaining_microphones)
+        client.portal.call(purge)
+        remaining = client.portal.call(remaining_microphones)
+        sensors = {sensor["mic_id"] for sensor in client.get("/get_sensors").json()}
+
+    assert job.status()["status"] == "done"
+    assert remaining == {5: 44.0, 701: 43.0}
+    # Everything present at the start except the mic that moved meanwhile
+    assert job.status()["deleted"]["microphones"] == len(before) - 1
+    assert sensors == {5, 701}
@@ -0,0 +1,76 @@
+import asyncio
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+import main  # Registers every model on Base.metadata
+from app.models.base import Base
+from app.models.gunshot_event import GunshotEvent
+from app.models.log_event import LogEvent
+from app.utils.database import insert_ignore_duplicates, upgrade_schema
+
+# The tables as create_all made them before gunshot_event_logs and the new indexes existed
+BASELINE_SCHEMA = [
+    "CREATE TABLE gunshot_events (id INTEGER NOT NULL, timestamp BIGINT NOT NULL, lat FLOAT, lon FLOAT, "
+    "logs JSON NOT NULL, PRIMARY KEY (id))",
+    "CREATE INDEX ix_gunshot_events_id ON gunshot_events (id)",
+    "CREATE TABLE log_events (id INTEGER NOT NULL, timestamp BIGINT, lat FLOAT NOT NULL, lon FLOAT NOT NULL, "
+    "mic_id INTEGER NOT NULL, PRIMARY KEY (id))",
+    "CREATE INDEX ix_log_events_id ON log_events (id)",
+    "CREATE INDEX ix_log_events_timestamp ON log_events (timestamp)",
+    "CREATE TABLE microphones (mic_id INTEGER NOT NULL, lat FLOAT NOT NULL, lon FLOAT NOT NULL, PRIMARY KEY (mic_id))",
+    "CREATE INDEX ix_microphones_mic_id ON microphones (mic_id)",
+]
+
+
+def upgrade(conn):
+    Base.metadata.create_all(conn)
+    upgrade_schema(conn)
+
+
+def test_baseline_database_is_upgraded_in_place(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'baseline.db'}")
+
+    async def scenario():
+        async with engine.begin() as conn:
+            for statement in BASELINE_SCHEMA:
+                await conn.execute(text(statement))
+            await conn.execute(text(
+                "INSERT INTO log_events (timestamp, lat, lon, mic_id) VALUES "
+                "(100, 1, 1, 1), (100, 1, 1, 1), (100, 1, 1, 2), (200, 1, 1, 1), (NULL, 1, 1, 1), (NULL, 1, 1, 1)"
+            ))
+            await conn.execute(text(
+                "INSERT INTO gunshot_events (timestamp, lat, lon, logs) VALUES (100, 1.5, 2.5, '[{\"id\": 1}]')"
+            ))
+
+        # Startup runs it every time; the second run must find nothing left to do
+        for _ in range(2):
+            async with engine.begin() as conn:
+                await conn.run_sync(upgrade)
+
+        async with engine.begin() as conn:
+            columns = await conn.run_sync(lambda sync: inspect(sync).get_columns("gunshot_events"))
+            assert {c["name"]: c["nullable"] for c in columns}["logs"] is True
+            indexes = await conn.run_sync(lambda sync: {
+                table: {index["name"]: index["unique"] for index in inspect(sync).get_indexes(table)}
+                for table in ("log_events", "gunshot_events")
+            })
+            assert indexes["log_events"]["ix_log_events_mic_id_timestamp"]
+            assert "ix_gunshot_events_timestamp" in indexes["gunshot_events"]
+
+            # The legacy event survived the rebuild, and new events can leave logs empty
+            event = (await conn.execute(select(GunshotEvent))).one()
+            assert (event.id, event.timestamp, event.lat, event.lon, event.logs) == (1, 100, 1.5, 2.5, [{"id": 1}])
+            await conn.execute(GunshotEvent.__table__.insert().values(timestamp=300, lat=0, lon=0, logs=None))
+
+            # Only the later copy of the duplicate went; rows without a timestamp are left alone
+            ids = (await conn.scalars(select(LogEvent.id).order_by(LogEvent.id))).all()
+            assert ids == [1, 3, 4, 5, 6]
+
+            # Duplicates are now caught by the index
+            result = await conn.execute(
+                insert_ignore_duplicates(LogEvent).values([{"timestamp": 100, "lat": 1, "lon": 1, "mic_id": 1}])
+            )
+            assert result.rowcount == 0
+
+        await engine.dispose()
+
+    asyncio.run(scenario())
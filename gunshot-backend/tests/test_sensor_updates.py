@@ -0,0 +1,46 @@
+import asyncio
+import math
+import random
+import time
+from app.utils.sensor_updates import SensorBroadcastScheduler
+
+
+class StubManager:
+    """Stands in for the WebSocket manager and records every publish."""
+
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, message, key, kind, **options):
+        self.published.append((time.monotonic(), message))
+
+
+def test_burst_of_sensor_changes_is_coalesced(monkeypatch):
+    manager = StubManager()
+    monkeypatch.setattr("app.utils.sensor_updates.manager", manager)
+    interval_ms = 50
+    duration = 1.0
+    rng = random.Random(15)
+
+    async def burst():
+        scheduler = SensorBroadcastScheduler(interval_ms=interval_ms)
+        mic_ids = list(range(200))
+        rng.shuffle(mic_ids)
+        started = time.monotonic()
+        # 200 new sensors come online over one second, a few per /log_event
+        while mic_ids:
+            batch = [mic_ids.pop() for _ in range(min(len(mic_ids), rng.randint(1, 3)))]
+            scheduler.mark_dirty({mic_id: (42.0 + mic_id * 1e-4, -83.0) for mic_id in batch})
+            await asyncio.sleep(duration / 100)
+        elapsed = time.monotonic() - started
+        await scheduler.flush_task  # The trailing broadcast for the last changes
+        return scheduler, elapsed
+
+    scheduler, elapsed = asyncio.run(burst())
+
+    assert len(manager.published) <= math.ceil(elapsed / (interval_ms / 1000)) + 1
+    assert scheduler.broadcasts == len(manager.published)
+    delivered = {sensor["mic_id"] for _, message in manager.published for sensor in message["sensors"]}
+    assert delivered == set(range(200))
+    gaps = [b - a for (a, _), (b, _) in zip(manager.published, manager.published[1:])]
+    assert all(gap >= interval_ms / 1000 * 0.9 for gap in gaps)
@@ -0,0 +1,71 @@
+import asyncio
+import random
+import time
+from app.models.log_event import LogEvent
+from app.utils.detect_gunshots import group_logs
+from app.utils.stream_detector import StreamingGunshotDetector
+
+DAY = 86_400_000_000
+
+
+def make_detector():
+    """A detector whose closed groups are collected instead of located and saved."""
+    detector = StreamingGunshotDetector()
+    closed = []
+
+    async def capture(groups):
+        closed.extend(groups)
+
+    detector.emit = capture
+    return detector, closed
+
+
+def make_log(log_id, mic_id, timestamp):
+    return LogEvent(id=log_id, timestamp=timestamp, lat=42.0, lon=-83.0, mic_id=mic_id)
+
+
+def shots(closed):
+    return [group for group in closed if len(group["mic_ids"]) >= 3]
+
+
+def test_future_dated_log_does_not_close_other_groups_early():
+    detector, closed = make_detector()
+    now = int(time.time() * 1e6)
+
+    async def scenario():
+        # One log per feed, the way /log_event delivers them
+        for mic_id in range(3):
+            await detector.feed([make_log(mic_id, mic_id, now + mic_id * 1000)])
+        await detector.feed([make_log(99, 99, now + 300 * DAY)])
+        for mic_id in range(3):
+            await detector.feed([make_log(10 + mic_id, 10 + mic_id, now + 1_500_000 + mic_id * 1000)])
+        await detector.flush(force=True)
+
+    asyncio.run(scenario())
+
+    assert len(shots(closed)) == 2
+    assert detector.watermark <= time.time() * 1e6 + detector.allowed_lateness
+
+
+def test_large_batch_groups_like_group_logs():
+    rng = random.Random(3)
+    now = int(time.time() * 1e6)
+    # 20k logs over 400 s from 50 mics, as a long Wi-Fi dropout would deliver them
+    timestamps = sorted(rng.sample(range(now - 400_000_000, now), 20_000))
+    logs = [make_log(i, rng.randrange(50), timestamp) for i, timestamp in enumerate(timestamps)]
+    detector, closed = make_detector()
+
+    async def scenario():
+        await detector.feed(logs)
+        open_after_feed = len(detector.open_groups)
+        await detector.flush(force=True)
+        return open_after_feed
+
+    open_after_feed = asyncio.run(scenario())
+
+    def ids(groups):
+        return sorted(tuple(log.id for log in group["logs"]) for group in groups)
+
+    assert ids(closed) == ids(group_logs(logs))
+    # Only groups from the last horizon are left open; everything older was retired during the feed
+    assert open_after_feed < 100
@@ -1,4 +1,4 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { MapContainer, TileLayer, Marker, Popup, useMap, Circle } from "react-leaflet";
 import L from "leaflet";
 import "leaflet/dist/leaflet.css";
@@ -28,6 +28,7 @@ export default function GunshotMap() {
   const [selectedTimestamp, setSelectedTimestamp] = useState(null);
   const [allLogs, setAllLogs] = useState([]);
   const [triggeredMicIds, setTriggeredMicIds] = useState([]);
+  const sensorVersion = useRef(null);
 
   useEffect(() => {
     fetchSensors();
@@ -42,7 +43,24 @@ export default function GunshotMap() {
         console.log("Message received:", event.data);
         const data = JSON.parse(event.data);
         if (data.type === "sensor_update") {
+          // Full snapshot: sent on connect and after a resync request
+          sensorVersion.current = data.version;
           setSensors(data.sensors);
+        } else if (data.type === "sensor_delta") {
+          if (sensorVersion.current === null || data.version <= sensorVersion.current) return;
+          // base_version can skip ahead of version - 1 when the server filtered deltas outside our area
+          const baseVersion = data.base_version ?? data.version - 1;
+          if (baseVersion !== sensorVersion.current) {
+            // Missed a delta; ask for a fresh snapshot instead of patching
+            ws.send(JSON.stringify({ type: "resync" }));
+            return;
+          }
+          sensorVersion.current = data.version;
+          setSensors((prevSensors) => {
+            const byId = new Map(prevSensors.map((sensor) => [sensor.mic_id, sensor]));
+            data.sensors.forEach((sensor) => byId.set(sensor.mic_id, sensor));
+            return [...byId.values()];
+          });
         } else if (data.gunshot_events) {
           const currentTimeMicro = Date.now() * 1000;
           const recentEvents = data.gunshot_events.filter((event) => {
@@ -87,9 +105,17 @@ export default function GunshotMap() {
 
   const fetchTimestamps = async () => {
     try {
-      const response = await fetch(`${BASE_URL}/get_all_logs`);
-      if (!response.ok) throw new Error("Failed to fetch timestamps");
-      const data = await response.json();
+      // /get_all_logs is paginated; follow X-Next-Cursor until the last page
+      const data = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ limit: "10000" });
+        if (cursor) params.set("cursor", cursor);
+        const response = await fetch(`${BASE_URL}/get_all_logs?${params}`);
+        if (!response.ok) throw new Error("Failed to fetch timestamps");
+        data.push(...(await response.json()));
+        cursor = response.headers.get("X-Next-Cursor");
+      } while (cursor);
       setAllLogs(data); // ✅ store all logs
 
       const uniqueTimestamps = [...new Set(data.map(log => log.timestamp))];